@@ -2,6 +2,7 @@ from typing import Annotated
 
 from fastapi import APIRouter, Query, status
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from sqlmodel import select
 
 from app.database.deps import CurrentTenant, SessionDep
@@ -37,8 +38,8 @@ async def create_account(
 
     try:
         session.add(account_db)
-        session.commit()
-        session.refresh(account_db)
+        await session.commit()
+        await session.refresh(account_db)
 
         log_operation(
             operation="CREATE",
@@ -50,7 +51,7 @@ async def create_account(
 
         return account_db
     except IntegrityError as exc:
-        session.rollback()
+        await session.rollback()
 
         message = (
             "External id already exists"
@@ -71,7 +72,7 @@ async def create_account(
 
 
 @router.get("/")
-def read_accounts(
+async def read_accounts(
     session: SessionDep,
     current_tenant: CurrentTenant,
     offset: int = 0,
@@ -86,11 +87,13 @@ def read_accounts(
         detail=f"offset: {offset} limit: {limit}",
     )
 
-    accounts = session.exec(
-        select(Account)
-        .where(Account.tenant_id == current_tenant.id)
-        .offset(offset)
-        .limit(limit)
+    accounts = (
+        await session.exec(
+            select(Account)
+            .where(Account.tenant_id == current_tenant.id)
+            .offset(offset)
+            .limit(limit)
+        )
     ).all()
 
     log_operation(
@@ -105,7 +108,7 @@ def read_accounts(
 
 
 @router.get("/{account_id}")
-def read_account(
+async def read_account(
     account_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -119,9 +122,11 @@ def read_account(
         detail=f"account id {account_id}",
     )
 
-    account = session.exec(
-        select(Account).where(
-            Account.id == account_id, Account.tenant_id == current_tenant.id
+    account = (
+        await session.exec(
+            select(Account)
+            .options(selectinload(Account.custom_fields), selectinload(Account.address))
+            .where(Account.id == account_id, Account.tenant_id == current_tenant.id)
         )
     ).first()
 
@@ -150,7 +155,7 @@ def read_account(
 
 
 @router.delete("/{account_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_account(
+async def delete_account(
     account_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -164,9 +169,11 @@ def delete_account(
         detail=f"account id {account_id}",
     )
 
-    account = session.exec(
-        select(Account).where(
-            Account.id == account_id, Account.tenant_id == current_tenant.id
+    account = (
+        await session.exec(
+            select(Account).where(
+                Account.id == account_id, Account.tenant_id == current_tenant.id
+            )
         )
     ).first()
 
@@ -183,8 +190,8 @@ def delete_account(
 
         raise NotFoundError()
 
-    session.delete(account)
-    session.commit()
+    await session.delete(account)
+    await session.commit()
 
     log_operation(
         operation="DELETE",
@@ -198,7 +205,7 @@ def delete_account(
 
 
 @router.put("/{account_id}")
-def update_address(
+async def update_address(
     account_id: int,
     account: AccountBase,
     session: SessionDep,
@@ -213,9 +220,11 @@ def update_address(
         detail=f"account id {account_id} data {account.model_dump()}",
     )
 
-    account_db = session.exec(
-        select(Account).where(
-            Account.id == account_id, Account.tenant_id == current_tenant.id
+    account_db = (
+        await session.exec(
+            select(Account).where(
+                Account.id == account_id, Account.tenant_id == current_tenant.id
+            )
         )
     ).first()
 
@@ -237,8 +246,8 @@ def update_address(
 
     try:
         session.add(account_db)
-        session.commit()
-        session.refresh(account_db)
+        await session.commit()
+        await session.refresh(account_db)
 
         log_operation(
             operation="UPDATE",
@@ -250,7 +259,7 @@ def update_address(
 
         return account_db
     except IntegrityError as exc:
-        session.rollback()
+        await session.rollback()
 
         message = (
             "External id already exists"
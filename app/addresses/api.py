@@ -1,6 +1,7 @@
 from typing import Annotated
 
 from fastapi import APIRouter, Query, status
+from sqlalchemy.orm import selectinload
 from sqlmodel import select
 
 from app.database.deps import CurrentTenant, SessionDep
@@ -31,7 +32,7 @@ async def create_address(
         detail=address.model_dump(),
     )
 
-    if not session.get(Account, address.account_id):
+    if not await session.get(Account, address.account_id):
 
         log_operation(
             operation="CREATE",
@@ -48,8 +49,8 @@ async def create_address(
         address, update={"tenant_id": current_tenant.id}
     )
     session.add(address_db)
-    session.commit()
-    session.refresh(address_db)
+    await session.commit()
+    await session.refresh(address_db)
 
     log_operation(
         operation="CREATE",
@@ -63,7 +64,7 @@ async def create_address(
 
 
 @router.get("/")
-def read_addresses(
+async def read_addresses(
     session: SessionDep,
     current_tenant: CurrentTenant,
     offset: int = 0,
@@ -78,11 +79,13 @@ def read_addresses(
         detail=f"offset : {offset} limit: {limit}",
     )
 
-    addresses = session.exec(
-        select(Address)
-        .where(Address.tenant_id == current_tenant.id)
-        .offset(offset)
-        .limit(limit)
+    addresses = (
+        await session.exec(
+            select(Address)
+            .where(Address.tenant_id == current_tenant.id)
+            .offset(offset)
+            .limit(limit)
+        )
     ).all()
 
     log_operation(
@@ -97,7 +100,7 @@ def read_addresses(
 
 
 @router.get("/{address_id}")
-def read_address(
+async def read_address(
     address_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -111,9 +114,11 @@ def read_address(
         detail=f"address id {address_id}",
     )
 
-    address = session.exec(
-        select(Address).where(
-            Address.id == address_id, Address.tenant_id == current_tenant.id
+    address = (
+        await session.exec(
+            select(Address)
+            .options(selectinload(Address.account))
+            .where(Address.id == address_id, Address.tenant_id == current_tenant.id)
         )
     ).first()
 
@@ -142,7 +147,7 @@ def read_address(
 
 
 @router.delete("/{address_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_address(
+async def delete_address(
     address_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -156,9 +161,11 @@ def delete_address(
         detail=f"address id {address_id}",
     )
 
-    address = session.exec(
-        select(Address).where(
-            Address.id == address_id, Address.tenant_id == current_tenant.id
+    address = (
+        await session.exec(
+            select(Address).where(
+                Address.id == address_id, Address.tenant_id == current_tenant.id
+            )
         )
     ).first()
 
@@ -175,8 +182,8 @@ def delete_address(
 
         raise NotFoundError()
 
-    session.delete(address)
-    session.commit()
+    await session.delete(address)
+    await session.commit()
 
     log_operation(
         operation="DELETE",
@@ -190,7 +197,7 @@ def delete_address(
 
 
 @router.put("/{address_id}")
-def update_address(
+async def update_address(
     address_id: int,
     address: AddressBase,
     session: SessionDep,
@@ -205,9 +212,11 @@ def update_address(
         detail=f"address id {address_id} data {address.model_dump()}",
     )
 
-    address_db = session.exec(
-        select(Address).where(
-            Address.id == address_id, Address.tenant_id == current_tenant.id
+    address_db = (
+        await session.exec(
+            select(Address).where(
+                Address.id == address_id, Address.tenant_id == current_tenant.id
+            )
         )
     ).first()
 
@@ -227,8 +236,8 @@ def update_address(
     address_data = address.model_dump(exclude_unset=True)
     address_db.sqlmodel_update(address_data)
     session.add(address_db)
-    session.commit()
-    session.refresh(address_db)
+    await session.commit()
+    await session.refresh(address_db)
 
     log_operation(
         operation="UPDATE",
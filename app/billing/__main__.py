@@ -0,0 +1,88 @@
+"""Run the billing without Celery
+
+python -m app.billing run [--date YYYY-MM-DD] [--since YYYY-MM-DD]
+    [--tenant ID] [--workers N]
+python -m app.billing scheduler [--interval SECONDS]
+"""
+
+import argparse
+import os
+import threading
+from datetime import date, datetime, time, timezone
+
+from app.billing.jobs import start_embedded_scheduler
+from app.billing.local import run_billing_local
+from app.settings import EMBEDDED_SCHEDULER_INTERVAL
+
+
+def parse_args(args=None) -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(prog="python -m app.billing")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="invoice the subscriptions due on a date")
+    run.add_argument(
+        "--date",
+        type=date.fromisoformat,
+        default=datetime.now(timezone.utc).date(),
+        help="billing date, defaults to today (UTC)",
+    )
+    run.add_argument(
+        "--since",
+        type=date.fromisoformat,
+        help="catch-up mode, also invoice the periods missed since this date",
+    )
+    run.add_argument("--tenant", type=int, help="only the accounts of this tenant id")
+    run.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count(),
+        help="worker processes, defaults to the number of CPUs",
+    )
+
+    scheduler = commands.add_parser(
+        "scheduler", help="run the periodic jobs without Celery beat"
+    )
+    scheduler.add_argument(
+        "--interval",
+        type=int,
+        default=EMBEDDED_SCHEDULER_INTERVAL,
+        help="seconds between two checks of the due jobs",
+    )
+
+    return parser.parse_args(args)
+
+
+def main(args=None):
+
+    args = parse_args(args)
+
+    if args.command == "scheduler":
+        stop_scheduler = start_embedded_scheduler(args.interval)
+
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            stop_scheduler()
+
+        return
+
+    report = run_billing_local(
+        datetime.combine(args.date, time()),
+        workers=args.workers,
+        since=args.since,
+        tenant_id=args.tenant,
+    )
+
+    print(
+        f"{report['invoices']} invoice(s) for {report['accounts']} account(s) "
+        f"and {report['subscriptions']} subscription(s) "
+        f"in {report['seconds']}s ({report['invoices_per_second']} invoices/s)"
+    )
+
+    for stage, seconds in report["stages"].items():
+        print(f"  {stage}: {seconds}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+import asyncio
+from datetime import datetime, time, timezone
+from typing import Annotated
+
+from fastapi import APIRouter, BackgroundTasks, Query, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.billing.runs import get_or_create_billing_run
+from app.database.deps import CurrentUser, SessionDep, async_engine
+from app.database.models import (
+    Account,
+    BillingRun,
+    BillingRunCreate,
+    BillingRunPublic,
+    BillingRunStatus,
+    Tenant,
+)
+from app.exceptions import BadRequestError, NotFoundError
+from app.logging import log_operation
+from app.responses import responses
+from app.scheduler import enqueue_billing_run
+
+router = APIRouter(prefix="/billing-runs", responses=responses)
+
+
+def billing_run_public(billing_run: BillingRun) -> BillingRunPublic:
+    """Return the public billing run with its rate in invoices per second
+
+    Args:
+        billing_run (BillingRun)
+    """
+
+    rate = None
+
+    if billing_run.started:
+        seconds = (
+            (billing_run.finished or billing_run.updated) - billing_run.started
+        ).total_seconds()
+        rate = round(billing_run.invoices_created / seconds, 2) if seconds > 0 else None
+
+    return BillingRunPublic.model_validate(billing_run, update={"rate": rate})
+
+
+@router.post("/", status_code=status.HTTP_202_ACCEPTED)
+async def create_billing_run(
+    billing_run: BillingRunCreate,
+    background_tasks: BackgroundTasks,
+    session: SessionDep,
+    current_user: CurrentUser,
+) -> BillingRunPublic:
+
+    log_operation(
+        operation="CREATE",
+        model="BillingRun",
+        status="PENDING",
+        user_id=current_user.id,
+        detail=billing_run.model_dump(),
+    )
+
+    if billing_run.tenant_id and not await session.get(Tenant, billing_run.tenant_id):
+
+        log_operation(
+            operation="CREATE",
+            model="BillingRun",
+            status="FAILED",
+            user_id=current_user.id,
+            detail=f"tenant id {billing_run.tenant_id} not found",
+        )
+
+        raise BadRequestError(detail="Tenant not exists")
+
+    if billing_run.account_id:
+        account = await session.get(Account, billing_run.account_id)
+
+        if not account or billing_run.tenant_id not in (None, account.tenant_id):
+
+            log_operation(
+                operation="CREATE",
+                model="BillingRun",
+                status="FAILED",
+                user_id=current_user.id,
+                detail=f"account id {billing_run.account_id} not found",
+            )
+
+            raise BadRequestError(detail="Account not exists")
+
+    billing_date = billing_run.billing_date or datetime.now(timezone.utc).date()
+    today = datetime.combine(billing_date, time())
+
+    billing_run_db = await session.run_sync(
+        get_or_create_billing_run,
+        today,
+        since=billing_run.since,
+        tenant_id=billing_run.tenant_id,
+        account_id=billing_run.account_id,
+    )
+
+    # After the response and off the event loop, on a worker if configured
+    if billing_run_db.status != BillingRunStatus.COMPLETED:
+        background_tasks.add_task(
+            enqueue_billing_run,
+            today,
+            since=billing_run.since,
+            tenant_id=billing_run.tenant_id,
+            account_id=billing_run.account_id,
+        )
+
+    log_operation(
+        operation="CREATE",
+        model="BillingRun",
+        status="SUCCESS",
+        user_id=current_user.id,
+        detail=f"billing run id {billing_run_db.id}",
+    )
+
+    return billing_run_public(billing_run_db)
+
+
+@router.get("/")
+async def read_billing_runs(
+    session: SessionDep,
+    current_user: CurrentUser,
+    offset: int = 0,
+    limit: Annotated[int, Query(le=100)] = 100,
+    billing_run_status: Annotated[
+        BillingRunStatus | None, Query(alias="status")
+    ] = None,
+) -> list[BillingRunPublic]:
+
+    log_operation(
+        operation="READ",
+        model="BillingRun",
+        status="PENDING",
+        user_id=current_user.id,
+        detail=f"offset : {offset} limit: {limit} status: {billing_run_status}",
+    )
+
+    statement = select(BillingRun)
+
+    if billing_run_status:
+        statement = statement.where(BillingRun.status == billing_run_status)
+
+    billing_runs = (
+        await session.exec(
+            statement.order_by(BillingRun.id.desc()).offset(offset).limit(limit)
+        )
+    ).all()
+
+    log_operation(
+        operation="READ",
+        model="BillingRun",
+        status="SUCCESS",
+        user_id=current_user.id,
+        detail=f"offset : {offset} limit: {limit} status: {billing_run_status}",
+    )
+
+    return [billing_run_public(billing_run) for billing_run in billing_runs]
+
+
+@router.get("/{billing_run_id}")
+async def read_billing_run(
+    billing_run_id: int, session: SessionDep, current_user: CurrentUser
+) -> BillingRunPublic:
+
+    billing_run = await session.get(BillingRun, billing_run_id)
+
+    if not billing_run:
+
+        log_operation(
+            operation="READ",
+            model="BillingRun",
+            status="FAILED",
+            user_id=current_user.id,
+            detail=f"billing run id {billing_run_id} not found",
+        )
+
+        raise NotFoundError()
+
+    return billing_run_public(billing_run)
+
+
+@router.get("/{billing_run_id}/events")
+async def stream_billing_run(
+    billing_run_id: int,
+    session: SessionDep,
+    current_user: CurrentUser,
+    interval: Annotated[float, Query(gt=0, le=60)] = 1,
+):
+    """Stream the progress of a billing run as server-sent events,
+    one event when its counters change, until it is completed or failed"""
+
+    if not await session.get(BillingRun, billing_run_id):
+
+        log_operation(
+            operation="READ",
+            model="BillingRun",
+            status="FAILED",
+            user_id=current_user.id,
+            detail=f"billing run id {billing_run_id} not found",
+        )
+
+        raise NotFoundError()
+
+    async def events():
+        last = None
+
+        while True:
+            async with AsyncSession(async_engine) as events_session:
+                billing_run = await events_session.get(BillingRun, billing_run_id)
+
+                if not billing_run:
+                    return
+
+                data = billing_run_public(billing_run).model_dump_json()
+                running = billing_run.status == BillingRunStatus.RUNNING
+
+            if data != last:
+                yield f"data: {data}\n\n"
+                last = data
+
+            if not running:
+                return
+
+            await asyncio.sleep(interval)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
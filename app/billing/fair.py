@@ -0,0 +1,128 @@
+from datetime import date, datetime
+from typing import Callable, Dict, List, Tuple
+
+from sqlmodel import Session, select
+
+from app.billing.runs import Throttle, iter_run_billing, shard_rate_limit
+from app.database.deps import engine
+from app.database.models import BillingSchedule, Tenant
+from app.logging import log_operation
+
+
+def due_tenants(today: datetime) -> Dict[int, Tuple[int, int | None]]:
+    """Return the billing weight and concurrency of the tenants
+    with subscriptions due today
+
+    Args:
+        today (datetime)
+
+    Returns:
+        Dict[int, Tuple[int, int | None]]: weight and concurrency by tenant id
+    """
+
+    due = (
+        select(BillingSchedule.tenant_id)
+        .where(BillingSchedule.due_date <= today.date())
+        .distinct()
+    )
+
+    with Session(engine) as session:
+        rows = session.exec(
+            select(Tenant.id, Tenant.billing_weight, Tenant.billing_concurrency)
+            .where(Tenant.id.in_(due))  # pylint: disable=no-member
+            .order_by(Tenant.id)
+        ).all()
+
+    return {tenant_id: (weight, concurrency) for tenant_id, weight, concurrency in rows}
+
+
+def run_billing_fair(
+    today: datetime,
+    shard: int = 0,
+    shards: int = 1,
+    since: date = None,
+    timezones: List[str] = None,
+    utc_offset: int = None,
+    timings: Dict[str, float] = None,
+    heartbeat: Callable[[], None] = None,
+) -> Dict[str, int]:
+    """Bill the shard with one billing run per tenant, interleaved by
+    weighted round-robin: each round bills `billing_weight` batches of every
+    tenant, so a large tenant does not delay the small ones.
+
+    A tenant with `billing_concurrency` is split in that many shards instead
+    of `shards`, and only billed by the first ones, capping the shard tasks
+    working on it at the same time. A failed tenant run does not stop the others.
+
+    Args:
+        today (datetime)
+        shard (int, optional)
+        shards (int, optional)
+        since (date, optional): catch-up mode, see `run_billing`
+        timezones (List[str], optional): hourly mode, see `run_billing`
+        utc_offset (int, optional)
+        timings (Dict[str, float], optional)
+        heartbeat (Callable[[], None], optional): see `run_billing`
+
+    Returns:
+        Dict[str, int]: accounts, invoices and subscriptions processed
+    """
+
+    runs = {}
+
+    # One rate limit for the shard, whatever the number of tenants
+    throttle = Throttle(shard_rate_limit(shards))
+
+    for tenant_id, (weight, concurrency) in due_tenants(today).items():
+
+        tenant_shards = min(concurrency or shards, shards)
+
+        if shard >= tenant_shards:
+            continue
+
+        runs[tenant_id] = (
+            weight,
+            iter_run_billing(
+                today,
+                shard,
+                tenant_shards,
+                since,
+                timezones,
+                utc_offset,
+                tenant_id=tenant_id,
+                timings=timings,
+                heartbeat=heartbeat,
+                throttle=throttle,
+            ),
+        )
+
+    total = {"accounts": 0, "invoices": 0, "subscriptions": 0}
+    errors = []
+
+    while runs:
+        for tenant_id, (weight, steps) in list(runs.items()):
+            for _ in range(weight):
+                try:
+                    next(steps)
+                except StopIteration as stop:
+                    for key, value in stop.value.items():
+                        total[key] += value
+                    del runs[tenant_id]
+                    break
+                except Exception as exc:  # pylint: disable=broad-exception-caught
+                    log_operation(
+                        operation="CREATE",
+                        model="BillingRun",
+                        status="FAILED",
+                        tenant_id=tenant_id,
+                        detail=f"billing run of tenant {tenant_id} failed: {exc!r}",
+                        level="error",
+                    )
+                    errors.append(exc)
+                    del runs[tenant_id]
+                    break
+
+    if errors:
+        raise errors[0]
+
+    return total
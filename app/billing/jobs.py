@@ -0,0 +1,290 @@
+import threading
+from datetime import datetime, time, timedelta, timezone
+from typing import Callable, Dict, List, Tuple
+
+from sqlalchemy import or_, update
+from sqlmodel import Session
+
+from app.billing.fair import run_billing_fair
+from app.billing.lease import new_owner
+from app.billing.runs import run_billing
+from app.billing.timezones import get_zone, timezones_at_midnight
+from app.database.deps import engine
+from app.database.models import ScheduledJob
+from app.invoices.bulk import insert_ignore_conflicts
+from app.logging import log_operation
+from app.settings import (
+    BILLING_LEASE_TTL,
+    BILLING_SCHEDULE,
+    BILLING_TENANT_FAIR,
+    EMBEDDED_SCHEDULER_INTERVAL,
+    TIME_ZONE,
+)
+from app.subscriptions.sweep import run_sweep
+
+
+def next_midnight(now: datetime) -> datetime:
+    """Return the next midnight of `TIME_ZONE` after `now`, like the daily
+    Celery beat entry
+
+    Args:
+        now (datetime): aware datetime
+    """
+
+    zone = get_zone(TIME_ZONE)
+    tomorrow = now.astimezone(zone).date() + timedelta(days=1)
+
+    return datetime.combine(tomorrow, time(), zone).astimezone(timezone.utc)
+
+
+def next_hour(now: datetime) -> datetime:
+    """Return the next o'clock after `now`
+
+    Args:
+        now (datetime): aware datetime
+    """
+
+    return now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+
+def bill_daily(now: datetime, heartbeat: Callable[[], None] = None):
+
+    today = now.astimezone(get_zone(TIME_ZONE)).date()
+
+    run_sweep(today)
+
+    billing = run_billing_fair if BILLING_TENANT_FAIR else run_billing
+    billing(datetime.combine(today, time()), heartbeat=heartbeat)
+
+
+def bill_hourly(now: datetime, heartbeat: Callable[[], None] = None):
+
+    billing = run_billing_fair if BILLING_TENANT_FAIR else run_billing
+
+    for utc_offset, (local_date, timezones) in timezones_at_midnight(now).items():
+        run_sweep(local_date, timezones)
+        billing(
+            datetime.combine(local_date, time()),
+            timezones=timezones,
+            utc_offset=utc_offset,
+            heartbeat=heartbeat,
+        )
+
+
+# Job name: (next run after a datetime, job called with the claim heartbeat)
+JOBS: Dict[
+    str,
+    Tuple[
+        Callable[[datetime], datetime],
+        Callable[[datetime, Callable[[], None]], None],
+    ],
+] = {
+    "billing": (
+        (next_hour, bill_hourly)
+        if BILLING_SCHEDULE == "hourly"
+        else (next_midnight, bill_daily)
+    ),
+}
+
+
+def ensure_jobs(now: datetime):
+    """Register the jobs missing from the job table, first due at their
+    next run after `now`
+
+    Args:
+        now (datetime)
+    """
+
+    with Session(engine) as session:
+        session.execute(
+            insert_ignore_conflicts(session, ScheduledJob, ["name"]),
+            [
+                {"name": name, "next_run": get_next_run(now)}
+                for name, (get_next_run, _) in JOBS.items()
+            ],
+        )
+        session.commit()
+
+
+def claim_job(
+    name: str, owner: str, now: datetime, ttl: int = BILLING_LEASE_TTL
+) -> bool:
+    """Claim a due job that no other process is running, in a single
+    conditional UPDATE
+
+    Args:
+        name (str)
+        owner (str)
+        now (datetime)
+        ttl (int, optional): seconds until the claim is stale
+
+    Returns:
+        bool: True if `owner` claimed the job
+    """
+
+    with Session(engine) as session:
+        result = session.execute(
+            update(ScheduledJob)
+            .where(
+                ScheduledJob.name == name,
+                ScheduledJob.next_run <= now,
+                or_(
+                    ScheduledJob.locked_until == None,
+                    ScheduledJob.locked_until < now,
+                ),
+            )
+            .values(owner=owner, locked_until=now + timedelta(seconds=ttl))
+        )
+        session.commit()
+
+    return result.rowcount == 1
+
+
+def renew_job(name: str, owner: str, ttl: int = BILLING_LEASE_TTL) -> bool:
+    """Extend the claim of a running job held by `owner`
+
+    Args:
+        name (str)
+        owner (str)
+        ttl (int, optional)
+
+    Returns:
+        bool: False if the claim was taken over
+    """
+
+    with Session(engine) as session:
+        result = session.execute(
+            update(ScheduledJob)
+            .where(ScheduledJob.name == name, ScheduledJob.owner == owner)
+            .values(locked_until=datetime.now(timezone.utc) + timedelta(seconds=ttl))
+        )
+        session.commit()
+
+    return result.rowcount == 1
+
+
+def finish_job(
+    name: str, owner: str, now: datetime, status: str, next_run: datetime = None
+):
+    """Release the claim of a job, moving it to `next_run` if given
+
+    Args:
+        name (str)
+        owner (str)
+        now (datetime)
+        status (str)
+        next_run (datetime, optional)
+    """
+
+    values = {
+        "owner": None,
+        "locked_until": None,
+        "last_run": now,
+        "last_status": status,
+    }
+
+    if next_run:
+        values["next_run"] = next_run
+
+    with Session(engine) as session:
+        session.execute(
+            update(ScheduledJob)
+            .where(ScheduledJob.name == name, ScheduledJob.owner == owner)
+            .values(**values)
+        )
+        session.commit()
+
+
+def run_pending_jobs(now: datetime = None) -> List[str]:
+    """Run the due jobs claimed by this process. A failed job keeps its
+    next run, so it is retried on the next check. The claim is renewed
+    by the heartbeat of the billing run, before each batch, so a long job
+    is not taken over.
+
+    Args:
+        now (datetime, optional): defaults to now
+
+    Returns:
+        List[str]: names of the jobs run
+    """
+
+    if now is None:
+        now = datetime.now(timezone.utc)
+
+    ensure_jobs(now)
+
+    owner = new_owner()
+    done = []
+
+    for name, (get_next_run, job) in JOBS.items():
+
+        if not claim_job(name, owner, now):
+            continue
+
+        def heartbeat(name=name):
+            if not renew_job(name, owner):
+                log_operation(
+                    operation="UPDATE",
+                    model="ScheduledJob",
+                    status="FAILED",
+                    detail=f"job {name} was taken over",
+                    level="warning",
+                )
+
+        try:
+            job(now, heartbeat)
+        except Exception as exc:  # pylint: disable=broad-exception-caught
+            log_operation(
+                operation="UPDATE",
+                model="ScheduledJob",
+                status="FAILED",
+                detail=f"job {name} failed: {exc!r}",
+                level="error",
+            )
+            finish_job(name, owner, now, "FAILED")
+            continue
+
+        finish_job(name, owner, now, "SUCCESS", get_next_run(now))
+        done.append(name)
+
+    return done
+
+
+def start_embedded_scheduler(
+    interval: int = EMBEDDED_SCHEDULER_INTERVAL,
+) -> Callable[[], None]:
+    """Check the due jobs every `interval` seconds in a background thread,
+    instead of Celery beat and a worker. Several processes can run it,
+    each job is claimed by a single one.
+
+    Args:
+        interval (int, optional)
+
+    Returns:
+        Callable[[], None]: stops the thread
+    """
+
+    stop = threading.Event()
+
+    def loop():
+        while not stop.is_set():
+            try:
+                run_pending_jobs()
+            except Exception as exc:  # pylint: disable=broad-exception-caught
+                log_operation(
+                    operation="READ",
+                    model="ScheduledJob",
+                    status="FAILED",
+                    detail=f"embedded scheduler: {exc!r}",
+                    level="error",
+                )
+            stop.wait(interval)
+
+    thread = threading.Thread(target=loop, name="embedded-scheduler", daemon=True)
+    thread.start()
+
+    def stop_scheduler():
+        stop.set()
+        thread.join()
+
+    return stop_scheduler
@@ -0,0 +1,164 @@
+import os
+import socket
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Iterator
+from uuid import uuid4
+
+from sqlalchemy import delete, insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session
+
+from app.database.deps import engine
+from app.database.models import BillingLease
+from app.logging import log_operation
+from app.settings import BILLING_LEASE_TTL, BILLING_LEASE_WAIT
+
+
+class LeaseHeld(Exception):
+    """The lease is held by another owner"""
+
+
+class LeaseLost(Exception):
+    """The lease expired and was taken over by another owner"""
+
+
+def new_owner() -> str:
+    """Return a unique owner id for this process"""
+
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+def acquire_lease(name: str, owner: str, ttl: int = BILLING_LEASE_TTL) -> bool:
+    """Acquire the lease if it is free, stale or already held by `owner`
+
+    Args:
+        name (str)
+        owner (str)
+        ttl (int, optional): seconds until the lease is stale
+
+    Returns:
+        bool: True if `owner` holds the lease
+    """
+
+    now = datetime.now(timezone.utc)
+    expires = now + timedelta(seconds=ttl)
+
+    with Session(engine) as session:
+
+        result = session.execute(
+            update(BillingLease)
+            .where(
+                BillingLease.name == name,
+                or_(BillingLease.owner == owner, BillingLease.expires < now),
+            )
+            .values(owner=owner, expires=expires)
+        )
+
+        if result.rowcount == 0:
+            try:
+                session.execute(
+                    insert(BillingLease).values(name=name, owner=owner, expires=expires)
+                )
+            except IntegrityError:
+                session.rollback()
+                return False
+
+        session.commit()
+
+    return True
+
+
+def renew_lease(name: str, owner: str, ttl: int = BILLING_LEASE_TTL) -> bool:
+    """Extend the lease held by `owner`
+
+    Args:
+        name (str)
+        owner (str)
+        ttl (int, optional)
+
+    Returns:
+        bool: False if the lease was taken over
+    """
+
+    expires = datetime.now(timezone.utc) + timedelta(seconds=ttl)
+
+    with Session(engine) as session:
+        result = session.execute(
+            update(BillingLease)
+            .where(BillingLease.name == name, BillingLease.owner == owner)
+            .values(expires=expires)
+        )
+        session.commit()
+
+    return result.rowcount == 1
+
+
+def release_lease(name: str, owner: str):
+    """Release the lease if it is still held by `owner`
+
+    Args:
+        name (str)
+        owner (str)
+    """
+
+    with Session(engine) as session:
+        session.execute(
+            delete(BillingLease).where(
+                BillingLease.name == name, BillingLease.owner == owner
+            )
+        )
+        session.commit()
+
+
+@contextmanager
+def hold_lease(
+    name: str, ttl: int = BILLING_LEASE_TTL, wait: int = BILLING_LEASE_WAIT
+) -> Iterator[Callable[[], None]]:
+    """Hold the lease while the block runs, yielding the heartbeat
+    that renews it. A stale lease -- no heartbeat within `ttl` -- is taken over.
+
+    Args:
+        name (str)
+        ttl (int, optional): seconds until the lease is stale
+        wait (int, optional): seconds to wait for a held lease
+
+    Raises:
+        LeaseHeld: the lease is still held by another owner after `wait`
+        LeaseLost: from the heartbeat, the lease was taken over
+    """
+
+    owner = new_owner()
+    deadline = time.monotonic() + wait
+
+    while not acquire_lease(name, owner, ttl):
+        remaining = deadline - time.monotonic()
+
+        if remaining <= 0:
+            log_operation(
+                operation="CREATE",
+                model="BillingLease",
+                status="FAILED",
+                detail=f"lease {name} is held by another owner",
+                level="warning",
+            )
+            raise LeaseHeld(name)
+
+        time.sleep(min(remaining, 1))
+
+    def heartbeat():
+        if not renew_lease(name, owner, ttl):
+            log_operation(
+                operation="UPDATE",
+                model="BillingLease",
+                status="FAILED",
+                detail=f"lease {name} was taken over",
+                level="warning",
+            )
+            raise LeaseLost(name)
+
+    try:
+        yield heartbeat
+    finally:
+        release_lease(name, owner)
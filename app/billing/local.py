@@ -0,0 +1,99 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from time import perf_counter
+from typing import Dict, Tuple
+
+from app.billing.fair import run_billing_fair
+from app.billing.runs import run_billing
+from app.database.deps import engine
+from app.logging import log_operation
+from app.settings import BILLING_TENANT_FAIR
+from app.subscriptions.sweep import run_sweep
+
+
+def init_worker():
+    """Give the worker process its own connection pool instead of
+    the connections inherited from the parent on fork"""
+
+    engine.dispose(close=False)
+
+
+def run_shard(
+    today: datetime, shard: int, shards: int, since: date, tenant_id: int
+) -> Tuple[Dict[str, int], Dict[str, float]]:
+
+    timings = {}
+
+    if BILLING_TENANT_FAIR and not tenant_id:
+        result = run_billing_fair(
+            today, shard=shard, shards=shards, since=since, timings=timings
+        )
+    else:
+        result = run_billing(
+            today,
+            shard=shard,
+            shards=shards,
+            since=since,
+            tenant_id=tenant_id,
+            timings=timings,
+        )
+
+    return result, timings
+
+
+def run_billing_local(
+    today: datetime, workers: int = 1, since: date = None, tenant_id: int = None
+) -> Dict:
+    """Run the billing of `today` on this machine without the broker,
+    one shard per worker process.
+
+    Args:
+        today (datetime)
+        workers (int, optional): processes, accounts are split by `account_id % workers`
+        since (date, optional): catch-up mode, see `run_billing`
+        tenant_id (int, optional): only the accounts of this tenant
+
+    Returns:
+        Dict: totals, `seconds`, `invoices_per_second` and seconds by stage
+            summed over the workers
+    """
+
+    start = perf_counter()
+
+    run_sweep(today.date())
+
+    total = {"accounts": 0, "invoices": 0, "subscriptions": 0}
+    stages = {}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+        futures = [
+            executor.submit(run_shard, today, shard, workers, since, tenant_id)
+            for shard in range(workers)
+        ]
+
+        for future in futures:
+            result, timings = future.result()
+
+            for key, value in result.items():
+                total[key] += value
+
+            for stage, seconds in timings.items():
+                stages[stage] = stages.get(stage, 0) + seconds
+
+    seconds = perf_counter() - start
+
+    report = {
+        **total,
+        "seconds": round(seconds, 3),
+        "invoices_per_second": round(total["invoices"] / seconds, 1),
+        "stages": {stage: round(value, 3) for stage, value in stages.items()},
+    }
+
+    log_operation(
+        operation="CREATE",
+        model="Invoice",
+        status="SUCCESS",
+        detail=f"local billing run finished {report}",
+    )
+
+    return report
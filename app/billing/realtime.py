@@ -0,0 +1,56 @@
+from datetime import date, datetime, timezone
+from typing import Dict, Tuple
+
+from sqlmodel import Session
+
+from app.database.deps import engine
+from app.database.models import Subscription
+from app.invoices.bulk import bill_accounts
+from app.invoices.utils import valid_subscription_ids_for_invoice
+from app.logging import log_operation
+
+
+def bill_subscription(
+    subscription_id: int, today: datetime = None
+) -> Dict[Tuple[int, date], int]:
+    """Invoice a single subscription if it is due today.
+
+    Safe to run more than once: a subscription already charged for today,
+    or no longer valid for invoice (e.g cancelled), is skipped. Other
+    subscriptions of the account due the same day get their own invoice.
+
+    Args:
+        subscription_id (int)
+        today (datetime, optional): billing date, defaults to now
+
+    Returns:
+        Dict[Tuple[int, date], int]: invoice id by account id and billing date
+    """
+
+    if today is None:
+        today = datetime.now(timezone.utc).replace(microsecond=0)
+
+    with Session(engine) as session:
+
+        subscription = session.get(Subscription, subscription_id)
+
+        if (
+            not subscription
+            or subscription_id
+            not in valid_subscription_ids_for_invoice(today, [subscription_id], session)
+        ):
+            log_operation(
+                operation="CREATE",
+                model="Invoice",
+                status="FAILED",
+                detail=f"subscription id {subscription_id} is not due on {today.date()}",
+                level="warning",
+            )
+            return {}
+
+        invoice_ids, _ = bill_accounts(
+            session, {subscription.account_id: [subscription_id]}, today
+        )
+        session.commit()
+
+    return invoice_ids
@@ -0,0 +1,486 @@
+import time
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, Generator, List, TypeVar
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
+
+from app.billing.lease import LeaseHeld, LeaseLost, hold_lease
+from app.billing.timings import timed, timed_iter
+from app.database.deps import engine
+from app.database.models import BillingRun, BillingRunStatus
+from app.invoices.bulk import bill_accounts, insert_ignore_conflicts
+from app.invoices.utils import (
+    group_subscriptions_by_account,
+    iter_valid_subscriptions_for_invoice,
+)
+from app.logging import log_operation
+from app.settings import BILLING_BATCH_SIZE, BILLING_RATE_LIMIT, BILLING_WINDOW
+
+T = TypeVar("T")
+
+
+def billing_run_key(
+    billing_date: date,
+    shard: int = 0,
+    shards: int = 1,
+    since: date = None,
+    utc_offset: int = None,
+    tenant_id: int = None,
+    account_id: int = None,
+) -> str:
+    """Return the natural key of a billing run, unique per date, shard and scope
+
+    Args:
+        billing_date (date)
+        shard (int, optional)
+        shards (int, optional)
+        since (date, optional)
+        utc_offset (int, optional)
+        tenant_id (int, optional)
+        account_id (int, optional)
+
+    Returns:
+        str
+    """
+
+    return ":".join(
+        "" if value is None else str(value)
+        for value in (
+            billing_date,
+            utc_offset,
+            tenant_id,
+            account_id,
+            shard,
+            shards,
+            since,
+        )
+    )
+
+
+def billing_lease_name(
+    billing_date: date,
+    shard: int = 0,
+    utc_offset: int = None,
+    tenant_id: int = None,
+    account_id: int = None,
+) -> str:
+    """Return the lease name of the billing runs of a date and shard.
+    Runs of the same scope with other shard counts or catch-up dates share
+    the lease, they never bill the same accounts at the same time.
+
+    Args:
+        billing_date (date)
+        shard (int, optional)
+        utc_offset (int, optional)
+        tenant_id (int, optional)
+        account_id (int, optional)
+
+    Returns:
+        str
+    """
+
+    return "billing_run:" + ":".join(
+        "" if value is None else str(value)
+        for value in (billing_date, utc_offset, tenant_id, account_id, shard)
+    )
+
+
+def get_or_create_billing_run(
+    session: Session,
+    today: datetime,
+    shard: int = 0,
+    shards: int = 1,
+    since: date = None,
+    utc_offset: int = None,
+    tenant_id: int = None,
+    account_id: int = None,
+) -> BillingRun:
+    """Return the billing run of the date and shard, creating it if needed.
+    Concurrent callers insert the same `key`, the conflicting inserts are
+    skipped and every caller gets the same run.
+
+    Args:
+        session (Session)
+        today (datetime)
+        shard (int, optional)
+        shards (int, optional)
+        since (date, optional)
+        utc_offset (int, optional)
+        tenant_id (int, optional)
+        account_id (int, optional)
+
+    Returns:
+        BillingRun
+    """
+
+    key = billing_run_key(
+        today.date(), shard, shards, since, utc_offset, tenant_id, account_id
+    )
+
+    billing_run = BillingRun(
+        key=key,
+        billing_date=today.date(),
+        shard=shard,
+        shards=shards,
+        since=since,
+        utc_offset=utc_offset,
+        tenant_id=tenant_id,
+        account_id=account_id,
+    )
+
+    try:
+        session.exec(
+            insert_ignore_conflicts(session, BillingRun, ["key"]).values(
+                **billing_run.model_dump(exclude={"id"})
+            )
+        )
+        session.commit()
+    except IntegrityError:
+        # Dialects without ON CONFLICT, the run was created by another caller
+        session.rollback()
+
+    return session.exec(select(BillingRun).where(BillingRun.key == key)).one()
+
+
+class Throttle:
+    """Delays the batches of the billing runs sharing it to stay under
+    `rate` invoices per second, 0 disables it"""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.invoiced = 0
+        self.started = time.monotonic()
+
+    def wait(self, timings: Dict[str, float] = None):
+        """Sleep until the invoices billed so far are within the rate
+
+        Args:
+            timings (Dict[str, float], optional): adds the seconds slept
+        """
+
+        if not self.rate:
+            return
+
+        with timed(timings, "throttle"):
+            time.sleep(
+                max(0, self.invoiced / self.rate - (time.monotonic() - self.started))
+            )
+
+    def add(self, invoices: int):
+        self.invoiced += invoices
+
+
+def shard_rate_limit(shards: int, window: int = None) -> float:
+    """Return the invoices per second of a shard keeping the shards running
+    at the same time under `BILLING_RATE_LIMIT`.
+
+    Without a billing window every shard starts at once and they share the
+    limit. With a window the shards start one slot after the other, see
+    `slot_countdown`, and each gets the whole limit: a slot is expected to
+    finish before the next starts, size `BILLING_WINDOW` accordingly.
+
+    Args:
+        shards (int)
+        window (int, optional): minutes, defaults to `BILLING_WINDOW`
+    """
+
+    if window is None:
+        window = BILLING_WINDOW
+
+    return BILLING_RATE_LIMIT if window else BILLING_RATE_LIMIT / shards
+
+
+def exhaust(steps: Generator[None, None, T]) -> T:
+    """Run a step generator to the end and return its result
+
+    Args:
+        steps (Generator[None, None, T])
+    """
+
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+
+def run_result(billing_run: BillingRun) -> Dict[str, int]:
+
+    return {
+        "accounts": billing_run.accounts_processed,
+        "invoices": billing_run.invoices_created,
+        "subscriptions": billing_run.subscriptions_billed,
+    }
+
+
+def run_billing(
+    today: datetime,
+    shard: int = 0,
+    shards: int = 1,
+    since: date = None,
+    timezones: List[str] = None,
+    utc_offset: int = None,
+    tenant_id: int = None,
+    account_id: int = None,
+    timings: Dict[str, float] = None,
+    heartbeat: Callable[[], None] = None,
+) -> Dict[str, int]:
+    """Invoice every subscription due today in batches of `BILLING_BATCH_SIZE`
+    accounts, recording the progress in a `BillingRun`.
+
+    Each batch commits together with the run checkpoint, so a restarted run
+    continues after the last invoiced account instead of starting over.
+    The run is held by a lease, an overlapping execution of the same run
+    returns its current progress without billing.
+
+    Args:
+        today (datetime)
+        shard (int, optional): only accounts where `account_id % shards == shard`
+        shards (int, optional)
+        since (date, optional): catch-up mode, bill every period missed
+            from this date in the same pass
+        timezones (List[str], optional): hourly mode, only accounts in these
+            timezones, whose local date is `today`
+        utc_offset (int, optional): hourly mode, offset of `timezones` in minutes
+        tenant_id (int, optional): only the accounts of this tenant
+        account_id (int, optional): only this account
+        timings (Dict[str, float], optional): collects the seconds spent
+            by stage, see `iter_bill_run`
+        heartbeat (Callable[[], None], optional): called before each batch,
+            e.g to renew the claim of the job running the billing
+
+    Returns:
+        Dict[str, int]: accounts, invoices and subscriptions processed
+    """
+
+    return exhaust(
+        iter_run_billing(
+            today,
+            shard,
+            shards,
+            since,
+            timezones,
+            utc_offset,
+            tenant_id,
+            account_id,
+            timings,
+            heartbeat,
+        )
+    )
+
+
+def iter_run_billing(
+    today: datetime,
+    shard: int = 0,
+    shards: int = 1,
+    since: date = None,
+    timezones: List[str] = None,
+    utc_offset: int = None,
+    tenant_id: int = None,
+    account_id: int = None,
+    timings: Dict[str, float] = None,
+    heartbeat: Callable[[], None] = None,
+    throttle: Throttle = None,
+) -> Generator[None, None, Dict[str, int]]:
+    """Step through `run_billing`, yielding after each committed batch.
+    The generator returns the result of the run. Runs stepped together,
+    see `run_billing_fair`, share a `throttle`.
+    """
+
+    with Session(engine) as session:
+
+        billing_run = get_or_create_billing_run(
+            session, today, shard, shards, since, utc_offset, tenant_id, account_id
+        )
+
+        if billing_run.status == BillingRunStatus.COMPLETED:
+            return run_result(billing_run)
+
+        run_id = billing_run.id
+
+    try:
+        with hold_lease(
+            billing_lease_name(today.date(), shard, utc_offset, tenant_id, account_id)
+        ) as renew_lease:
+
+            def renew():
+                renew_lease()
+
+                if heartbeat:
+                    heartbeat()
+
+            return (
+                yield from iter_bill_run(
+                    run_id,
+                    renew,
+                    today,
+                    shard,
+                    shards,
+                    since,
+                    timezones,
+                    tenant_id,
+                    account_id,
+                    timings,
+                    throttle,
+                )
+            )
+
+    except (LeaseHeld, LeaseLost):
+        # Another worker runs (or took over) this billing run
+        with Session(engine) as session:
+            return run_result(session.get(BillingRun, run_id))
+
+
+def iter_bill_run(
+    run_id: int,
+    heartbeat: Callable[[], None],
+    today: datetime,
+    shard: int = 0,
+    shards: int = 1,
+    since: date = None,
+    timezones: List[str] = None,
+    tenant_id: int = None,
+    account_id: int = None,
+    timings: Dict[str, float] = None,
+    throttle: Throttle = None,
+) -> Generator[None, None, Dict[str, int]]:
+    """Continue a billing run from its checkpoint, see `run_billing`,
+    yielding after each committed batch.
+    The caller holds the run lease, renewed by `heartbeat` before each batch.
+    Batches are delayed to stay under `BILLING_RATE_LIMIT` invoices per second,
+    shared between the shards running at the same time, see `shard_rate_limit`.
+
+    Args:
+        run_id (int)
+        heartbeat (Callable[[], None])
+        today (datetime)
+        shard (int, optional)
+        shards (int, optional)
+        since (date, optional)
+        timezones (List[str], optional)
+        tenant_id (int, optional)
+        account_id (int, optional)
+        timings (Dict[str, float], optional): adds the seconds spent selecting
+            the due subscriptions, billing, committing and throttling
+        throttle (Throttle, optional): shared with the other runs of the
+            shard, defaults to one of its own
+
+    Returns:
+        Dict[str, int]: accounts, invoices and subscriptions processed
+    """
+
+    with Session(engine) as session:
+
+        billing_run = session.get(BillingRun, run_id)
+
+        # Completed by the previous lease owner
+        if billing_run.status == BillingRunStatus.COMPLETED:
+            return run_result(billing_run)
+
+        if not billing_run.started:
+            billing_run.started = datetime.now(timezone.utc).replace(microsecond=0)
+
+        billing_run.status = BillingRunStatus.RUNNING
+        session.commit()
+
+        after_account_id = billing_run.last_account_id
+
+    log_operation(
+        operation="CREATE",
+        model="BillingRun",
+        status="PENDING",
+        detail=f"billing run {run_id} for {today.date()} since {since} "
+        f"shard {shard}/{shards} after account id {after_account_id}",
+    )
+
+    rows = timed_iter(
+        iter_valid_subscriptions_for_invoice(
+            today,
+            shard=shard,
+            shards=shards,
+            after_account_id=after_account_id,
+            since=since,
+            timezones=timezones,
+            tenant_id=tenant_id,
+            account_id=account_id,
+        ),
+        timings,
+        "select",
+    )
+
+    if throttle is None:
+        throttle = Throttle(shard_rate_limit(shards))
+
+    batch = {}
+
+    def flush():
+        throttle.wait(timings)
+
+        heartbeat()
+
+        with Session(engine) as session:
+            with timed(timings, "bill"):
+                invoice_ids, charged = bill_accounts(session, batch, today, since)
+
+            # Count the rows written, subscriptions already charged are skipped
+            billing_run = session.get(BillingRun, run_id)
+            billing_run.last_account_id = max(batch)
+            billing_run.accounts_processed += len(
+                {invoice_account_id for invoice_account_id, _ in invoice_ids}
+            )
+            billing_run.invoices_created += len(invoice_ids)
+            billing_run.subscriptions_billed += len(charged)
+            billing_run.updated = datetime.now(timezone.utc).replace(microsecond=0)
+
+            with timed(timings, "commit"):
+                session.commit()
+
+        throttle.add(len(invoice_ids))
+        batch.clear()
+
+    try:
+        for batch_account_id, subscription_ids in group_subscriptions_by_account(rows):
+            batch[batch_account_id] = subscription_ids
+
+            if len(batch) >= BILLING_BATCH_SIZE:
+                flush()
+                yield
+
+        if batch:
+            flush()
+
+    except LeaseLost:
+        raise
+
+    except Exception:
+        with Session(engine) as session:
+            billing_run = session.get(BillingRun, run_id)
+            billing_run.status = BillingRunStatus.FAILED
+            billing_run.failures += 1
+            session.commit()
+
+        log_operation(
+            operation="UPDATE",
+            model="BillingRun",
+            status="FAILED",
+            detail=f"billing run {run_id} failed",
+            level="error",
+        )
+        raise
+
+    with Session(engine) as session:
+        billing_run = session.get(BillingRun, run_id)
+        billing_run.status = BillingRunStatus.COMPLETED
+        billing_run.finished = datetime.now(timezone.utc).replace(microsecond=0)
+        session.commit()
+        session.refresh(billing_run)
+
+        log_operation(
+            operation="UPDATE",
+            model="BillingRun",
+            status="SUCCESS",
+            detail=billing_run.model_dump(),
+        )
+
+        return run_result(billing_run)
@@ -0,0 +1,82 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlmodel import Session, select
+
+from app.database.deps import engine
+from app.database.models import Account
+from app.logging import log_operation
+
+
+@lru_cache(maxsize=1024)
+def get_zone(name: str) -> tzinfo:
+    """Return the cached tz object of a timezone name, UTC if it is unknown
+
+    Args:
+        name (str)
+    """
+
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        log_operation(
+            operation="READ",
+            model="Account",
+            status="FAILED",
+            detail=f"unknown timezone {name}, using UTC",
+            level="warning",
+        )
+        return timezone.utc
+
+
+def bucket_timezones(
+    timezones: List[str], now: datetime
+) -> Dict[int, Tuple[date, List[str]]]:
+    """Bucket timezones by their UTC offset (minutes) at `now`,
+    with the local date of each bucket
+
+    Args:
+        timezones (List[str])
+        now (datetime): aware datetime
+
+    Returns:
+        Dict[int, Tuple[date, List[str]]]
+    """
+
+    buckets = defaultdict(list)
+    local_dates = {}
+
+    for name in timezones:
+        local = now.astimezone(get_zone(name))
+        utc_offset = int(local.utcoffset().total_seconds() // 60)
+        buckets[utc_offset].append(name)
+        local_dates[utc_offset] = local.date()
+
+    return {
+        utc_offset: (local_dates[utc_offset], names)
+        for utc_offset, names in buckets.items()
+    }
+
+
+def timezones_at_midnight(now: datetime) -> Dict[int, Tuple[date, List[str]]]:
+    """Return the buckets of account timezones whose local date
+    has just rolled over -- local time between 00:00 and 01:00
+
+    Args:
+        now (datetime): aware datetime
+
+    Returns:
+        Dict[int, Tuple[date, List[str]]]: local date and timezones by UTC offset
+    """
+
+    with Session(engine) as session:
+        timezones = session.exec(select(Account.timezone).distinct()).all()
+
+    return {
+        utc_offset: (local_date, names)
+        for utc_offset, (local_date, names) in bucket_timezones(timezones, now).items()
+        if (now + timedelta(minutes=utc_offset)).hour == 0
+    }
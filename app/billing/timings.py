@@ -0,0 +1,50 @@
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, TypeVar
+
+T = TypeVar("T")
+
+
+@contextmanager
+def timed(timings: Dict[str, float] | None, stage: str):
+    """Add the seconds spent in the block to `timings[stage]`
+
+    Args:
+        timings (Dict[str, float] | None): nothing is measured if None
+        stage (str)
+    """
+
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0) + time.perf_counter() - start
+
+
+def timed_iter(
+    iterable: Iterable[T], timings: Dict[str, float] | None, stage: str
+) -> Iterator[T]:
+    """Yield from `iterable`, adding the seconds spent producing
+    each item to `timings[stage]`
+
+    Args:
+        iterable (Iterable[T])
+        timings (Dict[str, float] | None)
+        stage (str)
+    """
+
+    iterator = iter(iterable)
+
+    while True:
+        with timed(timings, stage):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+
+        yield item
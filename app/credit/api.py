@@ -29,9 +29,11 @@ async def add_credit(
         detail=credit.model_dump(),
     )
 
-    account = session.exec(
-        select(Account).where(
-            Account.id == credit.account_id, Account.tenant_id == current_tenant.id
+    account = (
+        await session.exec(
+            select(Account).where(
+                Account.id == credit.account_id, Account.tenant_id == current_tenant.id
+            )
         )
     ).first()
 
@@ -54,8 +56,8 @@ async def add_credit(
 
     account.credit += credit.amount
     session.add(credit_history_db)
-    session.commit()
-    session.refresh(credit_history_db)
+    await session.commit()
+    await session.refresh(credit_history_db)
 
     log_operation(
         operation="CREATE",
@@ -80,9 +82,11 @@ async def delete_credit(
         detail=credit.model_dump(),
     )
 
-    account = session.exec(
-        select(Account).where(
-            Account.id == credit.account_id, Account.tenant_id == current_tenant.id
+    account = (
+        await session.exec(
+            select(Account).where(
+                Account.id == credit.account_id, Account.tenant_id == current_tenant.id
+            )
         )
     ).first()
 
@@ -106,8 +110,8 @@ async def delete_credit(
 
     account.credit -= credit.amount
     session.add(credit_history_db)
-    session.commit()
-    session.refresh(credit_history_db)
+    await session.commit()
+    await session.refresh(credit_history_db)
 
     log_operation(
         operation="DELETE",
@@ -1,6 +1,7 @@
 from typing import Annotated
 
 from fastapi import APIRouter, Query, status
+from sqlalchemy.orm import selectinload
 from sqlmodel import select
 
 from app.database.deps import CurrentTenant, SessionDep
@@ -35,10 +36,12 @@ async def create_custom_field(
 
     if custom_field.account_id:
 
-        account = session.exec(
-            select(Account).where(
-                Account.id == custom_field.account_id,
-                Account.tenant_id == current_tenant.id,
+        account = (
+            await session.exec(
+                select(Account).where(
+                    Account.id == custom_field.account_id,
+                    Account.tenant_id == current_tenant.id,
+                )
             )
         ).first()
 
@@ -57,10 +60,12 @@ async def create_custom_field(
 
     if custom_field.product_id:
 
-        product = session.exec(
-            select(Product).where(
-                Product.id == custom_field.product_id,
-                Product.tenant_id == current_tenant.id,
+        product = (
+            await session.exec(
+                select(Product).where(
+                    Product.id == custom_field.product_id,
+                    Product.tenant_id == current_tenant.id,
+                )
             )
         ).first()
 
@@ -79,10 +84,12 @@ async def create_custom_field(
 
     if custom_field.subscription_id:
 
-        subscription = session.exec(
-            select(Subscription).where(
-                Subscription.id == custom_field.subscription_id,
-                Subscription.tenant_id == current_tenant.id,
+        subscription = (
+            await session.exec(
+                select(Subscription).where(
+                    Subscription.id == custom_field.subscription_id,
+                    Subscription.tenant_id == current_tenant.id,
+                )
             )
         ).first()
 
@@ -103,8 +110,8 @@ async def create_custom_field(
         custom_field, update={"tenant_id": current_tenant.id}
     )
     session.add(custom_field_db)
-    session.commit()
-    session.refresh(custom_field_db)
+    await session.commit()
+    await session.refresh(custom_field_db)
 
     log_operation(
         operation="CREATE",
@@ -118,7 +125,7 @@ async def create_custom_field(
 
 
 @router.get("/")
-def read_custom_fields(
+async def read_custom_fields(
     session: SessionDep,
     current_tenant: CurrentTenant,
     offset: int = 0,
@@ -133,11 +140,13 @@ def read_custom_fields(
         detail=f"offset : {offset} limit: {limit}",
     )
 
-    custom_fields = session.exec(
-        select(CustomField)
-        .where(CustomField.tenant_id == current_tenant.id)
-        .offset(offset)
-        .limit(limit)
+    custom_fields = (
+        await session.exec(
+            select(CustomField)
+            .where(CustomField.tenant_id == current_tenant.id)
+            .offset(offset)
+            .limit(limit)
+        )
     ).all()
 
     log_operation(
@@ -152,7 +161,7 @@ def read_custom_fields(
 
 
 @router.get("/{custom_field_id}")
-def read_custom_field(
+async def read_custom_field(
     custom_field_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -166,10 +175,16 @@ def read_custom_field(
         detail=f"custom field id {custom_field_id}",
     )
 
-    custom_field = session.exec(
-        select(CustomField).where(
-            CustomField.id == custom_field_id,
-            CustomField.tenant_id == current_tenant.id,
+    custom_field = (
+        await session.exec(
+            select(CustomField)
+            .options(
+                selectinload(CustomField.account), selectinload(CustomField.product)
+            )
+            .where(
+                CustomField.id == custom_field_id,
+                CustomField.tenant_id == current_tenant.id,
+            )
         )
     ).first()
 
@@ -198,7 +213,7 @@ def read_custom_field(
 
 
 @router.delete("/{custom_field_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_custom_field(
+async def delete_custom_field(
     custom_field_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -212,10 +227,12 @@ def delete_custom_field(
         detail=f"custom field id {custom_field_id}",
     )
 
-    custom_field = session.exec(
-        select(CustomField).where(
-            CustomField.id == custom_field_id,
-            CustomField.tenant_id == current_tenant.id,
+    custom_field = (
+        await session.exec(
+            select(CustomField).where(
+                CustomField.id == custom_field_id,
+                CustomField.tenant_id == current_tenant.id,
+            )
         )
     ).first()
 
@@ -232,8 +249,8 @@ def delete_custom_field(
 
         raise NotFoundError()
 
-    session.delete(custom_field)
-    session.commit()
+    await session.delete(custom_field)
+    await session.commit()
 
     log_operation(
         operation="DELETE",
@@ -247,7 +264,7 @@ def delete_custom_field(
 
 
 @router.put("/{custom_field_id}")
-def update_custom_field(
+async def update_custom_field(
     custom_field_id: int,
     custom_field: CustomFieldBase,
     session: SessionDep,
@@ -262,10 +279,12 @@ def update_custom_field(
         detail=f"custom field id {custom_field_id} data {custom_field.model_dump()}",
     )
 
-    custom_field_db = session.exec(
-        select(CustomField).where(
-            CustomField.id == custom_field_id,
-            CustomField.tenant_id == current_tenant.id,
+    custom_field_db = (
+        await session.exec(
+            select(CustomField).where(
+                CustomField.id == custom_field_id,
+                CustomField.tenant_id == current_tenant.id,
+            )
         )
     ).first()
 
@@ -285,8 +304,8 @@ def update_custom_field(
     custom_field_data = custom_field.model_dump(exclude_unset=True)
     custom_field_db.sqlmodel_update(custom_field_data)
     session.add(custom_field_db)
-    session.commit()
-    session.refresh(custom_field_db)
+    await session.commit()
+    await session.refresh(custom_field_db)
 
     log_operation(
         operation="UPDATE",
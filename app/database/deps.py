@@ -1,15 +1,116 @@
-from typing import Annotated
+from typing import Annotated, Any, Dict
 
 from fastapi import Depends, HTTPException
-from fastapi.security import APIKeyHeader, HTTPBasic, HTTPBasicCredentials
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import (
+    APIKeyHeader,
+    HTTPAuthorizationCredentials,
+    HTTPBasic,
+    HTTPBasicCredentials,
+    HTTPBearer,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
 from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.database.models import Tenant, User
-from app.security import get_password_hash, verify_password
-from app.settings import ADMIN_PASSWORD, ADMIN_USERNAME, DATABASE_URL
+from app.security import (
+    get_password_hash,
+    tenant_cache,
+    user_cache,
+    verify_access_token,
+    verify_and_update_password,
+    verify_password,
+)
+from app.settings import (
+    ADMIN_PASSWORD,
+    ADMIN_USERNAME,
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_PRE_PING,
+    DATABASE_POOL_RECYCLE,
+    DATABASE_POOL_SIZE,
+    DATABASE_URL,
+    SQLITE_BUSY_TIMEOUT,
+    SQLITE_CACHE_SIZE,
+    SQLITE_JOURNAL_MODE,
+    SQLITE_MMAP_SIZE,
+    SQLITE_SYNCHRONOUS,
+)
+
+# Async drivers of the sync database urls
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
+
+
+def get_async_database_url(database_url: str) -> str:
+    """Return the database url with the async driver of its database,
+    e.g sqlite:///database.db -> sqlite+aiosqlite:///database.db
+
+    Args:
+        database_url (str)
+    """
+
+    url = make_url(database_url)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name())
+
+    if not drivername:
+        return database_url
+
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def get_engine_options(database_url: str) -> Dict[str, Any]:
+    """Return the connection pool options of the engine of `database_url`
+
+    Args:
+        database_url (str)
+    """
+
+    options = {
+        "pool_pre_ping": DATABASE_POOL_PRE_PING,
+        "pool_recycle": DATABASE_POOL_RECYCLE,
+    }
+
+    url = make_url(database_url)
+
+    # In-memory SQLite has a single connection per thread, not a sized pool
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return options
+
+    options.update(pool_size=DATABASE_POOL_SIZE, max_overflow=DATABASE_MAX_OVERFLOW)
+
+    return options
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Tune every new SQLite connection: with WAL readers do not block the
+    writer, and a writer waits `SQLITE_BUSY_TIMEOUT` for the lock of another
+    process instead of failing with "database is locked"
+    """
+
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT:d}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE:d}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE:d}")
+    cursor.close()
+
 
 connect_args = {"check_same_thread": False}
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+# Celery tasks and the billing runs
+engine = create_engine(
+    DATABASE_URL, connect_args=connect_args, **get_engine_options(DATABASE_URL)
+)
+# API routers
+async_engine = create_async_engine(
+    get_async_database_url(DATABASE_URL), **get_engine_options(DATABASE_URL)
+)
+
+if make_url(DATABASE_URL).get_backend_name() == "sqlite":
+    event.listen(engine, "connect", set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragmas)
 
 
 def create_db_and_tables():
@@ -42,61 +143,140 @@ def get_session():
         yield session
 
 
+async def get_async_session():
+    async with AsyncSession(async_engine, expire_on_commit=False) as session:
+        yield session
+
+
 security = HTTPBasic()
 
 api_key_scheme = APIKeyHeader(
     name="X-BillFlow-ApiKey",
     scheme_name="Bill Flow Api Key",
     description="Tenant Api key",
+    auto_error=False,
 )
 
 api_secret_scheme = APIKeyHeader(
     name="X-BillFlow-ApiSecret",
     scheme_name="Bill Flow Api Secret",
     description="Tenant Api Secret",
+    auto_error=False,
 )
 
+bearer_scheme = HTTPBearer(
+    scheme_name="Bill Flow Access Token",
+    description="Tenant access token, see POST /v1/tokens",
+    auto_error=False,
+)
 
-ApiKeyDep = Annotated[str, Depends(api_key_scheme)]
-ApiSecretDep = Annotated[str, Depends(api_secret_scheme)]
+
+ApiKeyDep = Annotated[str | None, Depends(api_key_scheme)]
+ApiSecretDep = Annotated[str | None, Depends(api_secret_scheme)]
+BearerDep = Annotated[HTTPAuthorizationCredentials | None, Depends(bearer_scheme)]
 CredentialsDep = Annotated[HTTPBasicCredentials, Depends(security)]
-SessionDep = Annotated[Session, Depends(get_session)]
+SessionDep = Annotated[AsyncSession, Depends(get_async_session)]
 
 
-def get_current_user(
+async def get_current_user(
     session: SessionDep,
     credentials: CredentialsDep,
 ) -> User:
 
-    user = session.exec(
-        select(User).where(User.username == credentials.username)
+    cache_key = user_cache.key(credentials.username, credentials.password)
+    verified = user_cache.get(cache_key)
+
+    user = (
+        await session.exec(select(User).where(User.username == credentials.username))
     ).first()
 
-    if (
-        not user
-        or not user.is_active
-        or not verify_password(credentials.password, user.password)
-    ):
+    if not user or not user.is_active:
+        raise HTTPException(status_code=401, detail="Incorrect username or password")
+
+    # Detached, so a rollback in the request does not expire it
+    session.expunge(user)
+
+    # Verified before against the same password hash, skip bcrypt
+    if verified == (user.id, user.password):
+        return user
+
+    # bcrypt is CPU bound, keep it off the event loop
+    valid, new_hash = await run_in_threadpool(
+        verify_and_update_password, credentials.password, user.password
+    )
+
+    if not valid:
         raise HTTPException(status_code=401, detail="Incorrect username or password")
 
+    # Rehash with the configured bcrypt cost
+    if new_hash:
+        user.password = new_hash
+        session.add(user)
+        await session.commit()
+        session.expunge(user)
+
+    user_cache.set(cache_key, (user.id, user.password))
+
     return user
 
 
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
-def get_current_tenant(
+async def get_tenant_by_credentials(
     session: SessionDep,
     key: ApiKeyDep,
     secret: ApiSecretDep,
 ) -> Tenant:
 
-    tenant = session.exec(select(Tenant).where(Tenant.api_key == key)).first()
+    if not key or not secret:
+        raise HTTPException(status_code=403, detail="Not authenticated")
+
+    cache_key = tenant_cache.key(key, secret)
+    verified = tenant_cache.get(cache_key)
+
+    tenant = (await session.exec(select(Tenant).where(Tenant.api_key == key))).first()
+
+    if tenant:
+        # Detached, so a rollback in the request does not expire it
+        session.expunge(tenant)
+
+    # Verified before against the same secret hash, skip bcrypt
+    if tenant and verified == (tenant.id, tenant.api_secret):
+        return tenant
 
-    if not tenant or not verify_password(secret, tenant.api_secret):
+    if not tenant or not await run_in_threadpool(
+        verify_password, secret, tenant.api_secret
+    ):
         raise HTTPException(status_code=401, detail="Incorrect tenant credentials")
 
+    tenant_cache.set(cache_key, (tenant.id, tenant.api_secret))
+
     return tenant
 
 
+CredentialsTenant = Annotated[Tenant, Depends(get_tenant_by_credentials)]
+
+
+async def get_current_tenant(
+    session: SessionDep,
+    key: ApiKeyDep,
+    secret: ApiSecretDep,
+    token: BearerDep,
+) -> Tenant:
+    """Authenticate the tenant by access token, without a database query,
+    or by api key and secret. A tenant authenticated by token only has its id.
+    """
+
+    if not token:
+        return await get_tenant_by_credentials(session, key, secret)
+
+    tenant_id = verify_access_token(token.credentials)
+
+    if tenant_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+
+    return Tenant(id=tenant_id)
+
+
 CurrentTenant = Annotated[User, Depends(get_current_tenant)]
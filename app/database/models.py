@@ -41,6 +41,12 @@ class TenantBase(SQLModel):
     api_key: str = Field(max_length=255, unique=True)
     api_secret: str = Field(min_length=8, max_length=255)
     external_id: str | None = Field(default=None, unique=True, index=True)
+    billing_weight: int = Field(
+        default=1, ge=1, description="Batches billed per round of the billing run"
+    )
+    billing_concurrency: int | None = Field(
+        default=None, ge=1, description="Shards billing the tenant at the same time"
+    )
 
 
 class Tenant(TenantBase, CreatedUpdatedFields, table=True):
@@ -59,6 +65,8 @@ class TenantUpdate(SQLModel):
     api_key: str | None = None
     api_secret: str | None = None
     external_id: str | None = None
+    billing_weight: int | None = Field(default=None, ge=1)
+    billing_concurrency: int | None = Field(default=None, ge=1)
 
 
 class TenantPublic(SQLModel):
@@ -66,6 +74,14 @@ class TenantPublic(SQLModel):
     name: str
     api_key: str
     external_id: str | None = None
+    billing_weight: int = 1
+    billing_concurrency: int | None = None
+
+
+class AccessToken(SQLModel):
+    access_token: str
+    token_type: str = "bearer"
+    expires: datetime
 
 
 class AccountBase(SQLModel):
@@ -73,7 +89,7 @@ class AccountBase(SQLModel):
     last_name: str | None = Field(max_length=50, default=None, index=True)
     email: EmailStr | None = Field(default=None, index=True, unique=True)
     phone: str | None = Field(max_length=25, default=None, index=True)
-    timezone: str = Field(default="UTC", max_length=50)
+    timezone: str = Field(default="UTC", max_length=50, index=True)
     external_id: str | None = Field(default=None, unique=True, index=True)
 
 
@@ -413,6 +429,7 @@ class Invoice(CreatedUpdatedFields, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     account_id: int = Field(foreign_key="account.id", ondelete="CASCADE")
     account: Account = Relationship(back_populates="invoices")
+    billing_date: date | None = Field(default=None, index=True)
     tenant_id: int = Field(foreign_key="tenant.id", ondelete="CASCADE")
     items: List["InvoiceItem"] = Relationship(back_populates="invoice")
     payments: List["Payment"] = Relationship(back_populates="invoice")
@@ -493,3 +510,126 @@ class PaymentItem(CreatedUpdatedFields, table=True):
     tenant_id: int = Field(foreign_key="tenant.id", ondelete="CASCADE")
     account_id: int = Field(foreign_key="account.id", ondelete="CASCADE")
     amount: Decimal = Field(decimal_places=3, ge=0)
+
+
+class BillingRunStatus(str, Enum):
+    RUNNING = "RUNNING"
+    COMPLETED = "COMPLETED"
+    FAILED = "FAILED"
+
+
+class BillingRun(CreatedUpdatedFields, table=True):
+
+    __tablename__ = "billing_run"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    key: str = Field(
+        unique=True,
+        description="Date, shard and scope of the run, see `billing_run_key`",
+    )
+    billing_date: date = Field(index=True)
+    shard: int = Field(default=0)
+    shards: int = Field(default=1)
+    since: date | None = Field(
+        default=None, description="Catch-up runs bill the missed periods from this date"
+    )
+    utc_offset: int | None = Field(
+        default=None,
+        description="Hourly runs bill the accounts at this offset (minutes)",
+    )
+    tenant_id: int | None = Field(
+        default=None,
+        foreign_key="tenant.id",
+        ondelete="CASCADE",
+        description="Only bill the accounts of this tenant",
+    )
+    account_id: int | None = Field(
+        default=None,
+        foreign_key="account.id",
+        ondelete="CASCADE",
+        description="Only bill this account",
+    )
+    status: BillingRunStatus = Field(default=BillingRunStatus.RUNNING)
+    last_account_id: int | None = Field(
+        default=None, description="Checkpoint, last account fully invoiced"
+    )
+    accounts_processed: int = Field(default=0)
+    invoices_created: int = Field(default=0)
+    subscriptions_billed: int = Field(default=0)
+    failures: int = Field(
+        default=0, description="Times the run failed, each retry resumes it"
+    )
+    started: datetime | None = Field(default=None)
+    finished: datetime | None = Field(default=None)
+
+
+class BillingRunCreate(SQLModel):
+    billing_date: date | None = Field(default=None, description="Defaults to today")
+    since: date | None = Field(
+        default=None, description="Catch-up runs bill the missed periods from this date"
+    )
+    tenant_id: int | None = None
+    account_id: int | None = None
+
+
+class BillingRunPublic(SQLModel):
+    id: int
+    billing_date: date
+    shard: int
+    shards: int
+    since: date | None
+    utc_offset: int | None
+    tenant_id: int | None
+    account_id: int | None
+    status: BillingRunStatus
+    last_account_id: int | None
+    accounts_processed: int
+    invoices_created: int
+    subscriptions_billed: int
+    failures: int = Field(description="Times the run failed, each retry resumes it")
+    started: datetime | None
+    finished: datetime | None
+    updated: datetime
+    rate: float | None = Field(default=None, description="Invoices per second")
+
+
+class BillingSchedule(SQLModel, table=True):
+
+    __tablename__ = "billing_schedule"
+
+    due_date: date = Field(primary_key=True)
+    account_id: int = Field(
+        primary_key=True, foreign_key="account.id", ondelete="CASCADE"
+    )
+    subscription_id: int = Field(
+        primary_key=True,
+        foreign_key="subscription.id",
+        ondelete="CASCADE",
+        index=True,
+    )
+    tenant_id: int = Field(foreign_key="tenant.id", ondelete="CASCADE")
+
+
+class BillingLease(SQLModel, table=True):
+
+    __tablename__ = "billing_lease"
+
+    name: str = Field(primary_key=True)
+    owner: str
+    expires: datetime = Field(
+        description="The lease is stale after this time and can be taken over"
+    )
+
+
+class ScheduledJob(SQLModel, table=True):
+
+    __tablename__ = "scheduled_job"
+
+    name: str = Field(primary_key=True)
+    next_run: datetime = Field(index=True)
+    owner: str | None = Field(default=None, description="Process running the job")
+    locked_until: datetime | None = Field(
+        default=None, description="The claim is stale after this time"
+    )
+    last_run: datetime | None = Field(default=None)
+    last_status: str | None = Field(default=None)
@@ -0,0 +1,375 @@
+from collections import defaultdict
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from itertools import repeat
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import bindparam, insert, update
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlmodel import Session, select
+
+from app.database.deps import engine
+from app.database.models import (
+    Account,
+    BillingPeriod,
+    BillingSchedule,
+    Invoice,
+    InvoiceItem,
+    Product,
+    Subscription,
+    SubscriptionProduct,
+)
+from app.invoices.create import (
+    add_billing_period,
+    calculate_dates_from_billing_periods,
+    charge_subscriptions,
+)
+from app.logging import log_operation
+from app.subscriptions.schedule import schedule_subscriptions
+
+
+def insert_ignore_conflicts(session: Session, model, index_elements: List[str]):
+    """Return an INSERT of `model` that skips the rows conflicting on
+    `index_elements`, so RETURNING only yields the inserted rows.
+    Other dialects fall back to a plain INSERT guarded by the unique constraint.
+
+    Args:
+        session (Session)
+        model (SQLModel)
+        index_elements (List[str])
+    """
+
+    dialect = session.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        return sqlite_insert(model).on_conflict_do_nothing(
+            index_elements=index_elements
+        )
+
+    if dialect == "postgresql":
+        return postgresql_insert(model).on_conflict_do_nothing(
+            index_elements=index_elements
+        )
+
+    return insert(model)
+
+
+def billing_dates(
+    billing_period: BillingPeriod,
+    due_date: date | None,
+    end_date: date | None,
+    today: date,
+    since: date = None,
+    billing_day: int = None,
+) -> Tuple[List[date], date]:
+    """Return the dates to invoice and the next billing date.
+
+    Without `since` the subscription is invoiced today. With `since`
+    (catch-up mode) every period from the due date up to today is
+    invoiced, skipping the ones before `since` or after the end date.
+
+    Args:
+        billing_period (BillingPeriod)
+        due_date (date | None): first unbilled date
+        end_date (date | None)
+        today (date)
+        since (date, optional)
+        billing_day (int, optional): aligns month based periods
+    """
+
+    if not since or not due_date:
+        return [today], add_billing_period(billing_period, today, billing_day)
+
+    dates = []
+    current = due_date
+
+    while current <= today:
+        if current >= since and (not end_date or current < end_date):
+            dates.append(current)
+        current = add_billing_period(billing_period, current, billing_day)
+
+    return dates, current
+
+
+def bill_accounts(
+    session: Session,
+    subscriptions_by_account: Dict[int, List[int]],
+    today: datetime,
+    since: date = None,
+) -> Tuple[Dict[Tuple[int, date], int], Set[int]]:
+    """Build the invoices of a batch of accounts in memory and write them
+    with multi-row statements. The caller owns the transaction.
+
+    Produces the same invoices, subscription dates and credit debits
+    as calling `create_invoice` with `skip_validation=True` for each account.
+    A subscription already charged for its billing dates is skipped with its
+    items, date updates and credit debit, see `charge_subscriptions`.
+    In catch-up mode (`since`) one invoice is created per account and
+    missed billing date, see `billing_dates`.
+
+    Args:
+        session (Session)
+        subscriptions_by_account (Dict[int, List[int]]): subscription ids by account id
+        today (datetime)
+        since (date, optional)
+
+    Returns:
+        Tuple[Dict[Tuple[int, date], int], Set[int]]: invoice id by account id
+            and billing date, and the ids of the subscriptions charged
+    """
+
+    if not subscriptions_by_account:
+        return {}, set()
+
+    account_ids = list(subscriptions_by_account.keys())
+    subscription_ids = [
+        subscription_id
+        for ids in subscriptions_by_account.values()
+        for subscription_id in ids
+    ]
+
+    tenants = dict(
+        session.exec(
+            # pylint: disable=no-member
+            select(Account.id, Account.tenant_id).where(Account.id.in_(account_ids))
+        ).all()
+    )
+
+    subscriptions = session.exec(
+        # pylint: disable=no-member
+        select(
+            Subscription.id,
+            Subscription.account_id,
+            Subscription.billing_period,
+            Subscription.end_date,
+            BillingSchedule.due_date,
+            Subscription.billing_day,
+        )
+        .outerjoin(BillingSchedule, BillingSchedule.subscription_id == Subscription.id)
+        .where(
+            Subscription.id.in_(subscription_ids),
+            Subscription.account_id.in_(tenants.keys()),
+        )
+    ).all()
+
+    lines = defaultdict(list)
+
+    for subscription_id, product_id, quantity, price, is_available in session.exec(
+        # pylint: disable=no-member
+        select(
+            SubscriptionProduct.subscription_id,
+            SubscriptionProduct.product_id,
+            SubscriptionProduct.quantity,
+            Product.price,
+            Product.is_available,
+        )
+        .join(Product)
+        .where(SubscriptionProduct.subscription_id.in_(subscription_ids))
+    ).all():
+        lines[subscription_id].append((product_id, quantity, price, is_available))
+
+    requested = {
+        (account_id, subscription_id)
+        for account_id, ids in subscriptions_by_account.items()
+        for subscription_id in ids
+    }
+
+    for account_id in account_ids:
+        if account_id not in tenants:
+            log_operation(
+                operation="CREATE",
+                model="Invoice",
+                status="FAILED",
+                detail=f"account id {account_id} not found",
+                level="warning",
+            )
+
+    billed = []
+
+    if not since:
+        next_billing_dates = dict(
+            zip(
+                [row[0] for row in subscriptions],
+                calculate_dates_from_billing_periods(
+                    [row[2] for row in subscriptions],
+                    repeat(today.date()),
+                    [row[5] for row in subscriptions],
+                ),
+            )
+        )
+
+    for (
+        subscription_id,
+        account_id,
+        billing_period,
+        end_date,
+        due_date,
+        billing_day,
+    ) in subscriptions:
+
+        if (account_id, subscription_id) not in requested:
+            continue
+
+        if since:
+            dates, next_billing_date = billing_dates(
+                billing_period, due_date, end_date, today.date(), since, billing_day
+            )
+        else:
+            dates = [today.date()]
+            next_billing_date = next_billing_dates[subscription_id]
+
+        billed.append((subscription_id, account_id, dates, next_billing_date))
+
+    # Claim the billing dates, one UPDATE per distinct period
+    periods_by_dates = defaultdict(list)
+
+    for subscription_id, _, dates, _ in billed:
+        if dates:
+            periods_by_dates[(dates[0], dates[-1])].append(subscription_id)
+
+    charged = set()
+
+    for (first_date, last_date), ids in periods_by_dates.items():
+        charged |= charge_subscriptions(session, ids, first_date, last_date)
+
+    skipped = sorted(
+        subscription_id
+        for subscription_id, _, dates, _ in billed
+        if dates and subscription_id not in charged
+    )
+
+    if skipped:
+        log_operation(
+            operation="CREATE",
+            model="Invoice",
+            status="FAILED",
+            detail=f"already charged subscription ids: {skipped}",
+            level="warning",
+        )
+
+    periods = []
+    subscription_updates = []
+    schedule = []
+
+    for subscription_id, account_id, dates, next_billing_date in billed:
+
+        if dates and subscription_id not in charged:
+            continue
+
+        periods.extend(
+            (subscription_id, account_id, billing_date) for billing_date in dates
+        )
+        subscription_updates.append(
+            {"id": subscription_id, "next_billing_date": next_billing_date}
+        )
+        schedule.append(
+            (subscription_id, account_id, tenants[account_id], next_billing_date)
+        )
+
+    invoice_keys = sorted(
+        {(account_id, billing_date) for _, account_id, billing_date in periods}
+    )
+    invoice_ids = {}
+
+    if invoice_keys:
+        invoice_ids = {
+            (account_id, billing_date): invoice_id
+            for account_id, billing_date, invoice_id in session.execute(
+                insert(Invoice).returning(
+                    Invoice.account_id, Invoice.billing_date, Invoice.id
+                ),
+                [
+                    {
+                        "account_id": account_id,
+                        "tenant_id": tenants[account_id],
+                        "billing_date": billing_date,
+                    }
+                    for account_id, billing_date in invoice_keys
+                ],
+            ).all()
+        }
+
+    invoice_items = []
+    totals = defaultdict(Decimal)
+
+    for subscription_id, account_id, billing_date in periods:
+        for product_id, quantity, price, is_available in lines[subscription_id]:
+            amount = price * quantity if is_available else 0
+
+            invoice_items.append(
+                {
+                    "invoice_id": invoice_ids[(account_id, billing_date)],
+                    "subscription_id": subscription_id,
+                    "product_id": product_id,
+                    "quantity": quantity,
+                    "amount": amount,
+                    "tenant_id": tenants[account_id],
+                    "account_id": account_id,
+                }
+            )
+
+            totals[account_id] += amount
+
+    if invoice_items:
+        session.execute(insert(InvoiceItem), invoice_items)
+
+    if subscription_updates:
+        session.execute(update(Subscription), subscription_updates)
+
+    schedule_subscriptions(session, schedule)
+
+    if totals:
+        account_table = Account.__table__
+        session.execute(
+            update(account_table)
+            .where(account_table.c.id == bindparam("b_account_id"))
+            .values(credit=account_table.c.credit - bindparam("b_amount")),
+            [
+                {"b_account_id": account_id, "b_amount": amount}
+                for account_id, amount in totals.items()
+            ],
+        )
+
+    log_operation(
+        operation="CREATE",
+        model="Invoice",
+        status="SUCCESS",
+        detail=f"{len(invoice_ids)} invoice(s) with {len(invoice_items)} item(s) "
+        f"for {len(subscription_updates)} subscription(s)",
+    )
+
+    return invoice_ids, charged
+
+
+def create_invoices_bulk(
+    subscriptions_by_account: Dict[int, List[int]],
+    today: datetime = None,
+    since: date = None,
+) -> Dict[Tuple[int, date], int]:
+    """Create the invoices of a batch of accounts in a single transaction.
+
+    Args:
+        subscriptions_by_account (Dict[int, List[int]]): subscription ids by account id
+        today (datetime, optional): billing date, defaults to now
+        since (date, optional): catch-up mode, see `bill_accounts`
+
+    Returns:
+        Dict[Tuple[int, date], int]: invoice id by account id and billing date
+    """
+
+    log_operation(
+        operation="CREATE",
+        model="Invoice",
+        status="PENDING",
+        detail=f"bulk for {len(subscriptions_by_account)} account(s)",
+    )
+
+    if today is None:
+        today = datetime.now(timezone.utc).today().replace(microsecond=0)
+
+    with Session(engine) as session:
+        invoice_ids, _ = bill_accounts(session, subscriptions_by_account, today, since)
+        session.commit()
+
+    return invoice_ids
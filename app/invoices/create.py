@@ -1,7 +1,12 @@
+from calendar import monthrange
 from datetime import date, datetime, timezone
-from typing import List
+from functools import lru_cache
+from itertools import repeat
+from typing import Iterable, List, Set
 
 from dateutil.relativedelta import relativedelta
+from sqlalchemy import or_, update
+from sqlalchemy.orm import selectinload
 from sqlmodel import Session, select
 
 from app.database.deps import engine
@@ -11,35 +16,167 @@ from app.database.models import (
     Invoice,
     InvoiceItem,
     Subscription,
+    SubscriptionProduct,
 )
-from app.invoices.utils import is_subscription_valid_for_invoice
+from app.invoices.utils import valid_subscription_ids_for_invoice
 from app.logging import log_operation
+from app.subscriptions.schedule import schedule_subscriptions
+
+BILLING_PERIOD_DAYS = {
+    BillingPeriod.DAILY: 1,
+    BillingPeriod.WEEKLY: 7,
+    BillingPeriod.BIWEEKLY: 15,
+    BillingPeriod.THIRTY_DAYS: 30,
+    BillingPeriod.THIRTY_ONE_DAYS: 31,
+}
+
+BILLING_PERIOD_MONTHS = {
+    BillingPeriod.MONTHLY: 1,
+    BillingPeriod.QUARTERLY: 3,
+    BillingPeriod.BIANNUAL: 6,
+    BillingPeriod.ANNUAL: 12,
+    BillingPeriod.SESQUIENNIAL: 18,
+    BillingPeriod.BIENNIAL: 24,
+    BillingPeriod.TRIENNIAL: 36,
+}
+
+BILLING_PERIOD_DELTAS = {
+    **{
+        billing_period: relativedelta(days=days)
+        for billing_period, days in BILLING_PERIOD_DAYS.items()
+    },
+    **{
+        billing_period: relativedelta(months=months)
+        for billing_period, months in BILLING_PERIOD_MONTHS.items()
+    },
+}
+
+
+def calculate_date_from_billing_period(
+    billing_period: BillingPeriod, _date: date, billing_day: int = None
+):
+    """Calculate the date from the billing period.
 
+    Args:
+        billing_period (BillingPeriod):
+        _date (date):
+        billing_day (int, optional): day of the month for month based
+            periods, clamped to the last day of short months
+    """
+
+    delta = BILLING_PERIOD_DELTAS.get(billing_period)
+
+    if billing_day and billing_period in BILLING_PERIOD_MONTHS:
+        delta = delta + relativedelta(day=billing_day)
+
+    return _date + delta
 
-def calculate_date_from_billing_period(billing_period: BillingPeriod, _date: date):
-    """Calculate the date from the billing period.
+
+@lru_cache(maxsize=None)
+def days_in_month(year: int, month: int) -> int:
+    return monthrange(year, month)[1]
+
+
+def add_billing_period(
+    billing_period: BillingPeriod, _date: date, billing_day: int = None
+) -> date:
+    """Integer month arithmetic equivalent to
+    `calculate_date_from_billing_period`, without building relativedelta objects
 
     Args:
         billing_period (BillingPeriod):
         _date (date):
+        billing_day (int, optional):
     """
 
-    billing_period_mapping = {
-        BillingPeriod.DAILY: relativedelta(days=1),
-        BillingPeriod.WEEKLY: relativedelta(weeks=1),
-        BillingPeriod.BIWEEKLY: relativedelta(days=15),
-        BillingPeriod.THIRTY_DAYS: relativedelta(days=30),
-        BillingPeriod.THIRTY_ONE_DAYS: relativedelta(days=31),
-        BillingPeriod.MONTHLY: relativedelta(months=1),
-        BillingPeriod.QUARTERLY: relativedelta(months=3),
-        BillingPeriod.BIANNUAL: relativedelta(months=6),
-        BillingPeriod.ANNUAL: relativedelta(years=1),
-        BillingPeriod.SESQUIENNIAL: relativedelta(months=18),
-        BillingPeriod.BIENNIAL: relativedelta(years=2),
-        BillingPeriod.TRIENNIAL: relativedelta(years=3),
-    }
+    months = BILLING_PERIOD_MONTHS.get(billing_period)
+
+    if months is None:
+        return date.fromordinal(_date.toordinal() + BILLING_PERIOD_DAYS[billing_period])
+
+    year, month = divmod(_date.year * 12 + _date.month - 1 + months, 12)
+    month += 1
+
+    return date(year, month, min(billing_day or _date.day, days_in_month(year, month)))
+
+
+def calculate_dates_from_billing_periods(
+    billing_periods: Iterable[BillingPeriod],
+    dates: Iterable[date],
+    billing_days: Iterable[int | None] = None,
+) -> List[date]:
+    """Batch version of `calculate_date_from_billing_period`.
 
-    return _date + billing_period_mapping.get(billing_period)
+    Each distinct (billing period, date, billing day) is computed once,
+    so whole billing batches that share a date cost a handful of
+    computations whatever their size.
+
+    Args:
+        billing_periods (Iterable[BillingPeriod]):
+        dates (Iterable[date]):
+        billing_days (Iterable[int | None], optional):
+
+    Returns:
+        List[date]
+    """
+
+    if billing_days is None:
+        billing_days = repeat(None)
+
+    computed = {}
+    result = []
+
+    for key in zip(billing_periods, dates, billing_days):
+        next_date = computed.get(key)
+
+        if next_date is None:
+            next_date = computed[key] = add_billing_period(*key)
+
+        result.append(next_date)
+
+    return result
+
+
+def charge_subscriptions(
+    session: Session,
+    subscription_ids: List[int],
+    first_date: date,
+    charged_through_date: date,
+) -> Set[int]:
+    """Mark the subscriptions charged through `charged_through_date`, skipping
+    the ones already charged on or after `first_date`, in a single conditional
+    UPDATE. A period is charged once even by overlapping or redelivered runs.
+    The caller owns the transaction.
+
+    Args:
+        session (Session)
+        subscription_ids (List[int])
+        first_date (date): first billing date of the period
+        charged_through_date (date): last billing date of the period
+
+    Returns:
+        Set[int]: ids of the subscriptions charged
+    """
+
+    if not subscription_ids:
+        return set()
+
+    return set(
+        session.execute(
+            update(Subscription)
+            .where(
+                # pylint: disable=no-member
+                Subscription.id.in_(subscription_ids),
+                or_(
+                    Subscription.charged_through_date == None,
+                    Subscription.charged_through_date < first_date,
+                ),
+            )
+            .values(charged_through_date=charged_through_date)
+            .returning(Subscription.id),
+            execution_options={"synchronize_session": False},
+        ).scalars()
+    )
 
 
 def create_invoice(account_id: int, subscription_ids: List[int], skip_validation=False):
@@ -69,34 +206,66 @@ def create_invoice(account_id: int, subscription_ids: List[int], skip_validation
 
         subscriptions = session.exec(
             # pylint: disable=no-member
-            select(Subscription).where(
+            select(Subscription)
+            .where(
                 Subscription.id.in_(subscription_ids),
                 Subscription.account_id == account_id,
             )
+            .options(
+                selectinload(Subscription.products).selectinload(
+                    SubscriptionProduct.product
+                )
+            )
         ).all()
 
-        invoice = Invoice(
-            tenant_id=account.tenant_id,
-            account_id=account.id,
-        )
+        if not skip_validation:
+            valid_ids = valid_subscription_ids_for_invoice(
+                today, [subs.id for subs in subscriptions], session
+            )
 
-        session.add(invoice)
+            for subs in subscriptions:
+                if subs.id not in valid_ids:
+                    log_operation(
+                        operation="CREATE",
+                        model="Invoice",
+                        status="FAILED",
+                        detail=f"subscription id {subs.id} is not valid for invoice",
+                        level="warning",
+                    )
 
-        total_amount = 0
+            subscriptions = [subs for subs in subscriptions if subs.id in valid_ids]
 
-        for subs in subscriptions:
+        charged = charge_subscriptions(
+            session, [subs.id for subs in subscriptions], today.date(), today.date()
+        )
 
-            if not skip_validation and not is_subscription_valid_for_invoice(
-                today, subs.id
-            ):
+        for subs in subscriptions:
+            if subs.id not in charged:
                 log_operation(
                     operation="CREATE",
                     model="Invoice",
                     status="FAILED",
-                    detail=f"subscription id {subs.id} is not valid for invoice",
+                    detail=f"subscription id {subs.id} already charged on {today.date()}",
                     level="warning",
                 )
-                continue
+
+        subscriptions = [subs for subs in subscriptions if subs.id in charged]
+
+        if not subscriptions:
+            return None
+
+        invoice = Invoice(
+            tenant_id=account.tenant_id,
+            account_id=account.id,
+            billing_date=today.date(),
+        )
+
+        session.add(invoice)
+
+        total_amount = 0
+        billed = []
+
+        for subs in subscriptions:
 
             for subs_product in subs.products:
                 amount = 0
@@ -127,7 +296,10 @@ def create_invoice(account_id: int, subscription_ids: List[int], skip_validation
             subs.charged_through_date = today.date()
 
             subs.next_billing_date = calculate_date_from_billing_period(
-                subs.billing_period, today.date()
+                subs.billing_period, today.date(), subs.billing_day
+            )
+            billed.append(
+                (subs.id, subs.account_id, subs.tenant_id, subs.next_billing_date)
             )
 
             log_operation(
@@ -148,6 +320,8 @@ def create_invoice(account_id: int, subscription_ids: List[int], skip_validation
 
         account.credit -= total_amount
 
+        schedule_subscriptions(session, billed)
+
         session.commit()
         session.refresh(invoice)
 
@@ -1,14 +1,35 @@
-from datetime import datetime
-from typing import List
+from datetime import date, datetime
+from itertools import groupby
+from typing import Iterator, List, Set, Tuple
 
+from sqlalchemy import tuple_
 from sqlmodel import Session, or_, select
 
 from app.database.deps import engine
-from app.database.models import PhaseType, State, Subscription, SubscriptionPhase
+from app.database.models import (
+    Account,
+    BillingSchedule,
+    PhaseType,
+    State,
+    Subscription,
+    SubscriptionPhase,
+)
 from app.logging import log_operation
 
 
-def statement(today: datetime):
+def statement(today: datetime, since: date = None):
+    """Select the subscriptions valid for invoice today.
+
+    With `since` (catch-up mode) the subscriptions whose next billing date
+    was missed since that date are valid too.
+    """
+
+    if since:
+        end_after = since
+        next_billing_date = Subscription.next_billing_date <= today.date()
+    else:
+        end_after = today.date()
+        next_billing_date = Subscription.next_billing_date == today.date()
 
     return (
         select(Subscription)
@@ -19,15 +40,12 @@ def statement(today: datetime):
         )
         .where(
             Subscription.state == State.ACTIVE,
-            or_(Subscription.end_date == None, Subscription.end_date > today.date()),
+            or_(Subscription.end_date == None, Subscription.end_date > end_after),
             or_(
                 Subscription.charged_through_date == None,
                 Subscription.charged_through_date < today.date(),
             ),
-            or_(
-                Subscription.next_billing_date == None,
-                Subscription.next_billing_date == today.date(),
-            ),
+            or_(Subscription.next_billing_date == None, next_billing_date),
         )
     )
 
@@ -69,14 +87,145 @@ def valid_subscriptions_for_invoice(
         return subscriptions
 
 
+def iter_valid_subscriptions_for_invoice(
+    today: datetime,
+    account_id: int = None,
+    page_size: int = 1000,
+    shard: int = 0,
+    shards: int = 1,
+    after_account_id: int = None,
+    since: date = None,
+    timezones: List[str] = None,
+    tenant_id: int = None,
+) -> Iterator[Tuple[int, int]]:
+    """Yield `(account_id, subscription_id)` of the valid subscriptions
+    for invoice, ordered by account.
+
+    Candidates come from a range scan of the billing schedule up to today.
+    Rows are read in keyset pages of `page_size`, so memory stays flat and
+    no cursor is left open while the caller writes between pages.
+
+    Args:
+        today (datetime)
+        account_id (int, optional)
+        page_size (int, optional)
+        shard (int, optional): only accounts where `account_id % shards == shard`
+        shards (int, optional)
+        after_account_id (int, optional): resume after this account
+        since (date, optional): catch-up mode, see `statement`
+        timezones (List[str], optional): only accounts in these timezones
+        tenant_id (int, optional)
+
+    Yields:
+        Tuple[int, int]
+    """
+
+    statement_select = (
+        statement(today, since)
+        .join(BillingSchedule, BillingSchedule.subscription_id == Subscription.id)
+        .where(BillingSchedule.due_date <= today.date())
+        .with_only_columns(Subscription.account_id, Subscription.id)
+        .distinct()
+        .order_by(Subscription.account_id, Subscription.id)
+        .limit(page_size)
+    )
+
+    if account_id:
+        statement_select = statement_select.where(Subscription.account_id == account_id)
+
+    if tenant_id:
+        statement_select = statement_select.where(Subscription.tenant_id == tenant_id)
+
+    if shards > 1:
+        statement_select = statement_select.where(
+            Subscription.account_id % shards == shard
+        )
+
+    if timezones is not None:
+        statement_select = statement_select.join(
+            Account, Account.id == Subscription.account_id
+        ).where(
+            Account.timezone.in_(timezones)  # pylint: disable=no-member
+        )
+
+    if after_account_id:
+        statement_select = statement_select.where(
+            Subscription.account_id > after_account_id
+        )
+
+    last = None
+
+    while True:
+
+        page_select = statement_select
+
+        if last:
+            page_select = page_select.where(
+                tuple_(Subscription.account_id, Subscription.id) > tuple_(*last)
+            )
+
+        with Session(engine) as session:
+            rows = session.execute(page_select).all()
+
+        for row in rows:
+            yield tuple(row)
+
+        if len(rows) < page_size:
+            break
+
+        last = tuple(rows[-1])
+
+
+def group_subscriptions_by_account(
+    rows: Iterator[Tuple[int, int]],
+) -> Iterator[Tuple[int, List[int]]]:
+    """Group `(account_id, subscription_id)` rows ordered by account,
+    yielding each account as soon as its group is complete
+
+    Args:
+        rows (Iterator[Tuple[int, int]])
+
+    Yields:
+        Tuple[int, List[int]]: account id and its subscription ids
+    """
+
+    for account_id, group in groupby(rows, key=lambda row: row[0]):
+        yield account_id, [subscription_id for _, subscription_id in group]
+
+
 def is_subscription_valid_for_invoice(today: datetime, subscription_id: int):
 
-    with Session(engine) as session:
+    return subscription_id in valid_subscription_ids_for_invoice(
+        today, [subscription_id]
+    )
 
-        statement_select = statement(today)
 
-        subscription = session.exec(
-            statement_select.where(Subscription.id == subscription_id)
-        ).first()
+def valid_subscription_ids_for_invoice(
+    today: datetime, subscription_ids: List[int], session: Session = None
+) -> Set[int]:
+    """Return the ids of the given subscriptions that are valid for invoice,
+    using a single query
+
+    Args:
+        today (datetime)
+        subscription_ids (List[int])
+        session (Session, optional): reuse an open session
+
+    Returns:
+        Set[int]
+    """
+
+    if not subscription_ids:
+        return set()
+
+    statement_select = (
+        statement(today)
+        .with_only_columns(Subscription.id)
+        .where(Subscription.id.in_(subscription_ids))  # pylint: disable=no-member
+    )
+
+    if session:
+        return set(session.exec(statement_select).all())
 
-        return bool(subscription)
+    with Session(engine) as new_session:
+        return set(new_session.exec(statement_select).all())
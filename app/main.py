@@ -9,6 +9,8 @@ from fastapi.openapi.docs import (
 from fastapi.staticfiles import StaticFiles
 
 from app.accounts.api import router as account_router
+from app.billing.api import router as billing_run_router
+from app.billing.jobs import start_embedded_scheduler
 from app.addresses.api import router as address_router
 from app.credit.api import router as credit_router
 from app.custom_fields.api import router as custom_fields_router
@@ -17,17 +19,27 @@ from app.payment_method.api import router as payment_methods_router
 from app.plugins.api import router as plugin_router
 from app.plugins.setup import setup_plugins
 from app.products.api import router as product_router
+from app.settings import EMBEDDED_SCHEDULER
 from app.subscriptions.api import router as subscription_router
+from app.subscriptions.schedule import init_billing_schedule
 from app.tenant.api import router as tenant_router
+from app.tokens.api import router as token_router
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     create_db_and_tables()
     init_db()
+    init_billing_schedule()
     setup_plugins()
+
+    stop_scheduler = start_embedded_scheduler() if EMBEDDED_SCHEDULER else None
+
     yield
 
+    if stop_scheduler:
+        stop_scheduler()
+
 
 app = FastAPI(
     lifespan=lifespan,
@@ -74,4 +86,6 @@ app.include_router(address_router, prefix="/v1", tags=["Addresses"])
 app.include_router(custom_fields_router, prefix="/v1", tags=["Custom Fields"])
 app.include_router(subscription_router, prefix="/v1", tags=["Subscriptions"])
 app.include_router(tenant_router, prefix="/v1", tags=["Tenants"])
+app.include_router(token_router, prefix="/v1", tags=["Tokens"])
 app.include_router(plugin_router, prefix="/v1", tags=["Plugins"])
+app.include_router(billing_run_router, prefix="/v1", tags=["Billing Runs"])
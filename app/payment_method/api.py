@@ -2,6 +2,7 @@ from typing import Annotated
 
 from fastapi import APIRouter, Query, status
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from sqlmodel import select, update
 
 from app.database.deps import CurrentTenant, SessionDep
@@ -35,7 +36,7 @@ async def create_payment_method(
         detail=payment_method.model_dump(),
     )
 
-    if not session.get(Account, payment_method.account_id):
+    if not await session.get(Account, payment_method.account_id):
 
         log_operation(
             operation="CREATE",
@@ -48,7 +49,7 @@ async def create_payment_method(
 
         raise BadRequestError(detail="Account not exists")
 
-    if not session.get(Plugin, payment_method.plugin_id):
+    if not await session.get(Plugin, payment_method.plugin_id):
 
         log_operation(
             operation="CREATE",
@@ -67,8 +68,8 @@ async def create_payment_method(
 
     try:
         session.add(payment_method_db)
-        session.commit()
-        session.refresh(payment_method_db)
+        await session.commit()
+        await session.refresh(payment_method_db)
 
         log_operation(
             operation="CREATE",
@@ -79,7 +80,7 @@ async def create_payment_method(
         )
 
         if payment_method_db.is_default:
-            session.exec(
+            await session.exec(
                 update(PaymentMethod)
                 .where(
                     PaymentMethod.account_id == payment_method.account_id,
@@ -87,12 +88,12 @@ async def create_payment_method(
                 )
                 .values(is_default=False)
             )
-            session.commit()
+            await session.commit()
 
         return payment_method_db
 
     except IntegrityError as exc:
-        session.rollback()
+        await session.rollback()
 
         message = "External id already exists"
 
@@ -109,7 +110,7 @@ async def create_payment_method(
 
 
 @router.get("/")
-def read_payment_methods(
+async def read_payment_methods(
     session: SessionDep,
     current_tenant: CurrentTenant,
     account_id: Annotated[
@@ -137,7 +138,7 @@ def read_payment_methods(
     if account_id:
         stmt = stmt.where(PaymentMethod.account_id == account_id)
 
-    payment_methods = session.exec(stmt).all()
+    payment_methods = (await session.exec(stmt)).all()
 
     log_operation(
         operation="READ",
@@ -151,7 +152,7 @@ def read_payment_methods(
 
 
 @router.get("/{payment_method_id}")
-def read_payment_method(
+async def read_payment_method(
     payment_method_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -165,10 +166,16 @@ def read_payment_method(
         detail=f"payment method id {payment_method_id}",
     )
 
-    payment_method = session.exec(
-        select(PaymentMethod).where(
-            PaymentMethod.id == payment_method_id,
-            PaymentMethod.tenant_id == current_tenant.id,
+    payment_method = (
+        await session.exec(
+            select(PaymentMethod)
+            .options(
+                selectinload(PaymentMethod.account), selectinload(PaymentMethod.plugin)
+            )
+            .where(
+                PaymentMethod.id == payment_method_id,
+                PaymentMethod.tenant_id == current_tenant.id,
+            )
         )
     ).first()
 
@@ -197,7 +204,7 @@ def read_payment_method(
 
 
 @router.delete("/{payment_method_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_payment_method(
+async def delete_payment_method(
     payment_method_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -214,10 +221,12 @@ def delete_payment_method(
         detail=f"payment method id {payment_method_id}",
     )
 
-    payment_method = session.exec(
-        select(PaymentMethod).where(
-            PaymentMethod.id == payment_method_id,
-            PaymentMethod.tenant_id == current_tenant.id,
+    payment_method = (
+        await session.exec(
+            select(PaymentMethod).where(
+                PaymentMethod.id == payment_method_id,
+                PaymentMethod.tenant_id == current_tenant.id,
+            )
         )
     ).first()
 
@@ -247,8 +256,8 @@ def delete_payment_method(
 
         raise BadRequestError(detail="Cannot delete default payment method")
 
-    session.delete(payment_method)
-    session.commit()
+    await session.delete(payment_method)
+    await session.commit()
 
     log_operation(
         operation="DELETE",
@@ -262,7 +271,7 @@ def delete_payment_method(
 
 
 @router.put("/{payment_method_id}")
-def update_payment_method(
+async def update_payment_method(
     payment_method_id: int,
     payment_method: PaymentMethodBase,
     session: SessionDep,
@@ -277,10 +286,12 @@ def update_payment_method(
         detail=f"payment method id {payment_method_id} data {payment_method.model_dump()}",
     )
 
-    payment_method_db = session.exec(
-        select(PaymentMethod).where(
-            PaymentMethod.id == payment_method_id,
-            PaymentMethod.tenant_id == current_tenant.id,
+    payment_method_db = (
+        await session.exec(
+            select(PaymentMethod).where(
+                PaymentMethod.id == payment_method_id,
+                PaymentMethod.tenant_id == current_tenant.id,
+            )
         )
     ).first()
 
@@ -304,11 +315,11 @@ def update_payment_method(
     try:
 
         session.add(payment_method_db)
-        session.commit()
-        session.refresh(payment_method_db)
+        await session.commit()
+        await session.refresh(payment_method_db)
 
         if payment_method_db.is_default:
-            session.exec(
+            await session.exec(
                 update(PaymentMethod)
                 .where(
                     PaymentMethod.account_id == payment_method_db.account_id,
@@ -316,7 +327,7 @@ def update_payment_method(
                 )
                 .values(is_default=0)
             )
-            session.commit()
+            await session.commit()
 
         log_operation(
             operation="UPDATE",
@@ -329,7 +340,7 @@ def update_payment_method(
         return payment_method_db
 
     except IntegrityError as exc:
-        session.rollback()
+        await session.rollback()
 
         message = "External id already exists"
 
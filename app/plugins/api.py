@@ -26,7 +26,7 @@ async def read_plugins(
         user_id=current_user.id,
     )
 
-    plugins = session.exec(select(Plugin).offset(offset).limit(limit)).all()
+    plugins = (await session.exec(select(Plugin).offset(offset).limit(limit))).all()
 
     log_operation(
         operation="READ",
@@ -2,6 +2,7 @@ from typing import Annotated, Literal
 
 from fastapi import APIRouter, Query, status
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from sqlmodel import select
 
 from app.database.deps import CurrentTenant, SessionDep
@@ -37,8 +38,8 @@ async def create_product(
 
     try:
         session.add(product_db)
-        session.commit()
-        session.refresh(product_db)
+        await session.commit()
+        await session.refresh(product_db)
 
         log_operation(
             operation="CREATE",
@@ -50,7 +51,7 @@ async def create_product(
 
         return product_db
     except IntegrityError as exc:
-        session.rollback()
+        await session.rollback()
 
         log_operation(
             operation="CREATE",
@@ -65,7 +66,7 @@ async def create_product(
 
 
 @router.get("/")
-def read_products(
+async def read_products(
     session: SessionDep,
     current_tenant: CurrentTenant,
     offset: int = 0,
@@ -108,7 +109,7 @@ def read_products(
             .limit(limit)
         )
 
-    products = session.exec(query).all()
+    products = (await session.exec(query)).all()
 
     log_operation(
         operation="READ",
@@ -122,7 +123,7 @@ def read_products(
 
 
 @router.get("/{product_id}")
-def read_product(
+async def read_product(
     product_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -136,9 +137,11 @@ def read_product(
         detail=f"product id {product_id}",
     )
 
-    product = session.exec(
-        select(Product).where(
-            Product.id == product_id, Product.tenant_id == current_tenant.id
+    product = (
+        await session.exec(
+            select(Product)
+            .options(selectinload(Product.custom_fields))
+            .where(Product.id == product_id, Product.tenant_id == current_tenant.id)
         )
     ).first()
 
@@ -167,7 +170,7 @@ def read_product(
 
 
 @router.delete("/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_product(
+async def delete_product(
     product_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -181,11 +184,13 @@ def delete_product(
         detail=f"product id {product_id}",
     )
 
-    product = session.exec(
-        select(Product).where(
-            Product.id == product_id,
-            Product.tenant_id == current_tenant.id,
-            Product.is_available == True,
+    product = (
+        await session.exec(
+            select(Product).where(
+                Product.id == product_id,
+                Product.tenant_id == current_tenant.id,
+                Product.is_available == True,
+            )
         )
     ).first()
 
@@ -203,7 +208,7 @@ def delete_product(
         raise NotFoundError(detail="Product is not available")
 
     product.is_available = False
-    session.commit()
+    await session.commit()
 
     log_operation(
         operation="DELETE",
@@ -217,7 +222,7 @@ def delete_product(
 
 
 @router.put("/{product_id}")
-def update_product(
+async def update_product(
     product_id: int,
     product: ProductBase,
     session: SessionDep,
@@ -232,9 +237,11 @@ def update_product(
         detail=f"product id {product_id} data {product.model_dump()}",
     )
 
-    product_db = session.exec(
-        select(Product).where(
-            Product.id == product_id, Product.tenant_id == current_tenant.id
+    product_db = (
+        await session.exec(
+            select(Product).where(
+                Product.id == product_id, Product.tenant_id == current_tenant.id
+            )
         )
     ).first()
 
@@ -256,8 +263,8 @@ def update_product(
 
     try:
         session.add(product_db)
-        session.commit()
-        session.refresh(product_db)
+        await session.commit()
+        await session.refresh(product_db)
 
         log_operation(
             operation="UPDATE",
@@ -270,7 +277,7 @@ def update_product(
         return product_db
 
     except IntegrityError as exc:
-        session.rollback()
+        await session.rollback()
 
         log_operation(
             operation="CREATE",
@@ -1,36 +1,257 @@
 import datetime
-from collections import defaultdict
 
-from celery import Celery
+from celery import Celery, chord
 from celery.schedules import crontab
 
-from app.invoices.create import create_invoice
-from app.invoices.utils import valid_subscriptions_for_invoice
-from app.settings import CELERY_BROKER_URL, TIME_ZONE
+from app.billing.fair import run_billing_fair
+from app.billing.realtime import bill_subscription
+from app.billing.runs import run_billing
+from app.billing.timezones import timezones_at_midnight
+from app.logging import log_operation
+from app.settings import (
+    BILLING_SCHEDULE,
+    BILLING_SHARDS,
+    BILLING_TENANT_FAIR,
+    BILLING_RUNS_CELERY,
+    BILLING_WINDOW,
+    CELERY_BROKER_URL,
+    CELERY_RESULT_BACKEND,
+    REALTIME_BILLING,
+    REALTIME_BILLING_HORIZON,
+    TIME_ZONE,
+)
+from app.subscriptions.sweep import run_sweep
 
-app = Celery("tasks", broker=CELERY_BROKER_URL)
+app = Celery("tasks", broker=CELERY_BROKER_URL, backend=CELERY_RESULT_BACKEND)
 
 app.conf.timezone = TIME_ZONE
 
 
+def visibility_timeout(
+    window: int = BILLING_WINDOW,
+    horizon: int = REALTIME_BILLING_HORIZON if REALTIME_BILLING else 0,
+) -> int:
+    """Return the broker visibility timeout (seconds) covering the delayed
+    tasks: the shards spread by `slot_countdown` over the billing window and
+    the realtime invoices queued up to `horizon` hours ahead. Redis
+    redelivers a task not acknowledged within this timeout, so a task delayed
+    past the default hour would be delivered again every hour until it runs.
+    Leaves an hour to run the last one.
+
+    Args:
+        window (int, optional): minutes
+        horizon (int, optional): hours, 0 when realtime billing is off
+    """
+
+    return max(window * 60, horizon * 3600) + 3600
+
+
+app.conf.broker_transport_options = {"visibility_timeout": visibility_timeout()}
+
+
 @app.on_after_configure.connect
 def setup_periodic_tasks(sender: Celery, **kwargs):
 
-    sender.add_periodic_task(
-        crontab(hour=0, minute=0), generate_invoices.s(), name="generate invoices"
-    )
+    if BILLING_SCHEDULE == "hourly":
+        sender.add_periodic_task(
+            crontab(minute=0),
+            generate_invoices_hourly.s(),
+            name="generate invoices hourly",
+        )
+    else:
+        sender.add_periodic_task(
+            crontab(hour=0, minute=0), generate_invoices.s(), name="generate invoices"
+        )
+
+
+def slot_countdown(shard: int, shards: int, window: int = BILLING_WINDOW) -> int:
+    """Return the delay (seconds) of a shard when the billing run is spread
+    over `window` minutes. Each shard is a slot, released at an even interval,
+    and an account always falls in the same slot (`account_id % shards`).
+
+    Args:
+        shard (int)
+        shards (int)
+        window (int, optional): minutes, 0 releases every slot at once
+    """
+
+    return window * 60 * shard // shards
+
+
+def dispatch_billing(
+    today: datetime.datetime,
+    shards: int,
+    since: str = None,
+    timezones: list = None,
+    utc_offset: int = None,
+):
+
+    return chord(
+        generate_invoices_shard.s(
+            today.isoformat(), shard, shards, since, timezones, utc_offset
+        ).set(countdown=slot_countdown(shard, shards))
+        for shard in range(shards)
+    )(aggregate_billing_results.s())
 
 
 @app.task
-def generate_invoices():
+def generate_invoices(shards: int = BILLING_SHARDS, since: str = None):
+    """Split the billing run into `shards` by account id and fan it out
+    as a chord of shard tasks.
+
+    Passing `since` (ISO date) runs in catch-up mode: every period missed
+    from that date up to today is invoiced in the same pass.
+    """
 
     today = datetime.datetime.now(datetime.timezone.utc).today().replace(microsecond=0)
 
-    subscriptions = valid_subscriptions_for_invoice(today)
+    run_sweep(today.date())
+
+    return dispatch_billing(today, shards, since)
+
+
+@app.task
+def generate_invoices_hourly(shards: int = BILLING_SHARDS):
+    """Bill the accounts whose local date has just rolled over,
+    one run per UTC offset bucket"""
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    buckets = timezones_at_midnight(now)
+
+    for utc_offset, (local_date, timezones) in buckets.items():
+        today = datetime.datetime.combine(local_date, datetime.time())
+        run_sweep(local_date, timezones)
+        dispatch_billing(today, shards, timezones=timezones, utc_offset=utc_offset)
+
+    return sorted(buckets.keys())
+
+
+@app.task
+def generate_invoices_shard(
+    today: str,
+    shard: int,
+    shards: int,
+    since: str = None,
+    timezones: list = None,
+    utc_offset: int = None,
+):
+
+    billing = run_billing_fair if BILLING_TENANT_FAIR else run_billing
+
+    return billing(
+        datetime.datetime.fromisoformat(today),
+        shard=shard,
+        shards=shards,
+        since=datetime.date.fromisoformat(since) if since else None,
+        timezones=timezones,
+        utc_offset=utc_offset,
+    )
+
+
+@app.task
+def generate_billing_run(
+    today: str, since: str = None, tenant_id: int = None, account_id: int = None
+):
+
+    return run_billing(
+        datetime.datetime.fromisoformat(today),
+        since=datetime.date.fromisoformat(since) if since else None,
+        tenant_id=tenant_id,
+        account_id=account_id,
+    )
+
+
+def enqueue_billing_run(
+    today: datetime.datetime,
+    since: datetime.date = None,
+    tenant_id: int = None,
+    account_id: int = None,
+):
+    """Run a billing run requested from the API on a Celery worker when
+    `BILLING_RUNS_CELERY` is set, else in this process
+
+    Args:
+        today (datetime.datetime)
+        since (datetime.date, optional)
+        tenant_id (int, optional)
+        account_id (int, optional)
+    """
+
+    if not BILLING_RUNS_CELERY:
+        run_billing(today, since=since, tenant_id=tenant_id, account_id=account_id)
+        return
+
+    generate_billing_run.apply_async(
+        (today.isoformat(), since.isoformat() if since else None, tenant_id, account_id)
+    )
+
+    log_operation(
+        operation="CREATE",
+        model="BillingRun",
+        status="PENDING",
+        detail=f"billing run for {today.date()} queued",
+    )
+
+
+@app.task
+def aggregate_billing_results(results: list):
+
+    total = {}
+
+    for result in results:
+        for key, value in result.items():
+            total[key] = total.get(key, 0) + value
+
+    log_operation(
+        operation="CREATE",
+        model="Invoice",
+        status="SUCCESS",
+        detail=f"billing run finished {total}",
+    )
+
+    return total
+
+
+@app.task
+def generate_subscription_invoice(subscription_id: int):
+
+    invoice_ids = bill_subscription(subscription_id)
+
+    return sorted(invoice_ids.values())
+
 
-    group_by = defaultdict(list)  # Group by user id
-    for s in subscriptions:
-        group_by[s.account_id].append(s.id)
+def enqueue_subscription_invoice(subscription_id: int, due_date: datetime.date):
+    """Queue the invoice of a subscription for its due moment, the start of
+    `due_date` (UTC), instead of waiting for the next billing run.
 
-    for account_id, subscription_ids in group_by.items():
-        create_invoice(account_id, subscription_ids, skip_validation=True)
+    Subscriptions due beyond `REALTIME_BILLING_HORIZON` hours are left to
+    the billing runs. The task id is fixed per subscription and due date
+    and the task is idempotent, so a duplicate delivery bills nothing.
+
+    Args:
+        subscription_id (int)
+        due_date (datetime.date | None)
+    """
+
+    if not REALTIME_BILLING or not due_date:
+        return
+
+    now = datetime.datetime.now(datetime.timezone.utc)
+    eta = datetime.datetime.combine(due_date, datetime.time(), datetime.timezone.utc)
+
+    if eta - now > datetime.timedelta(hours=REALTIME_BILLING_HORIZON):
+        return
+
+    generate_subscription_invoice.apply_async(
+        (subscription_id,),
+        eta=max(eta, now),
+        task_id=f"subscription-invoice-{subscription_id}-{due_date.isoformat()}",
+    )
+
+    log_operation(
+        operation="CREATE",
+        model="Invoice",
+        status="PENDING",
+        detail=f"subscription id {subscription_id} queued for {max(eta, now)}",
+    )
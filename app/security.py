@@ -1,11 +1,177 @@
+import base64
+import hashlib
+import hmac
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional, Tuple
+
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.settings import (
+    ACCESS_TOKEN_TTL,
+    AUTH_CACHE_SIZE,
+    AUTH_CACHE_TTL,
+    BCRYPT_ROUNDS,
+    SECRET_KEY,
+)
+
+# Hashes below BCRYPT_ROUNDS need an update, see `verify_and_update_password`
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+# Without SECRET_KEY the tokens are only valid in the process that issued them
+secret_key = (SECRET_KEY or secrets.token_urlsafe(32)).encode()
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 
+def verify_and_update_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Verify the password and return a new hash if the current one
+    is below the configured bcrypt cost
+
+    Args:
+        plain_password (str)
+        hashed_password (str)
+
+    Returns:
+        Tuple[bool, Optional[str]]: verified and the new hash, if any
+    """
+
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+
+class VerificationCache:
+    """Bounded TTL LRU cache of successful credential verifications.
+
+    Entries are keyed by an HMAC of the credentials with a random
+    per-process key, so no secret is kept in plaintext.
+    """
+
+    def __init__(self, maxsize: int = AUTH_CACHE_SIZE, ttl: int = AUTH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._hmac_key = secrets.token_bytes(32)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, *credentials: str) -> bytes:
+
+        message = b"\0".join(credential.encode() for credential in credentials)
+
+        return hmac.new(self._hmac_key, message, hashlib.sha256).digest()
+
+    def get(self, key: bytes) -> Any:
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                return None
+
+            expires, value = entry
+
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+
+            self._entries.move_to_end(key)
+
+            return value
+
+    def set(self, key: bytes, value: Any):
+
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, predicate: Callable[[Any], bool]):
+        """Remove the entries whose value matches `predicate`"""
+
+        with self._lock:
+            for key in [k for k, (_, v) in self._entries.items() if predicate(v)]:
+                del self._entries[key]
+
+    def clear(self):
+
+        with self._lock:
+            self._entries.clear()
+
+
+# (tenant id, api secret hash) by HMAC of (api key, api secret)
+tenant_cache = VerificationCache()
+
+# (user id, password hash) by HMAC of (username, password)
+user_cache = VerificationCache()
+
+
+def sign(payload: str) -> str:
+
+    digest = hmac.new(secret_key, payload.encode(), hashlib.sha256).digest()
+
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def create_access_token(
+    tenant_id: int, ttl: int = ACCESS_TOKEN_TTL
+) -> Tuple[str, datetime]:
+    """Return a bearer token signed with `SECRET_KEY` carrying
+    the tenant id and expiry, and its expiry
+
+    Args:
+        tenant_id (int)
+        ttl (int, optional): seconds
+    """
+
+    expires = int(time.time()) + ttl
+
+    payload = (
+        base64.urlsafe_b64encode(
+            json.dumps({"tenant_id": tenant_id, "exp": expires}).encode()
+        )
+        .rstrip(b"=")
+        .decode()
+    )
+
+    return f"{payload}.{sign(payload)}", datetime.fromtimestamp(expires, timezone.utc)
+
+
+def verify_access_token(token: str) -> int | None:
+    """Return the tenant id of a valid and unexpired token, None otherwise
+
+    Args:
+        token (str)
+    """
+
+    payload, _, signature = token.partition(".")
+
+    if not hmac.compare_digest(signature.encode(), sign(payload).encode()):
+        return None
+
+    data = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+
+    if data["exp"] < time.time():
+        return None
+
+    return data["tenant_id"]
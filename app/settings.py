@@ -1,9 +1,47 @@
 from decouple import config
 
 DATABASE_URL = config("DATABASE_URL", default="sqlite:///database.db")
+DATABASE_POOL_SIZE = config("DATABASE_POOL_SIZE", cast=int, default=5)
+DATABASE_MAX_OVERFLOW = config("DATABASE_MAX_OVERFLOW", cast=int, default=10)
+DATABASE_POOL_PRE_PING = config("DATABASE_POOL_PRE_PING", cast=bool, default=True)
+DATABASE_POOL_RECYCLE = config("DATABASE_POOL_RECYCLE", cast=int, default=-1)  # seconds
+SQLITE_JOURNAL_MODE = config("SQLITE_JOURNAL_MODE", default="WAL")
+SQLITE_SYNCHRONOUS = config("SQLITE_SYNCHRONOUS", default="NORMAL")
+SQLITE_BUSY_TIMEOUT = config("SQLITE_BUSY_TIMEOUT", cast=int, default=5000)  # ms
+SQLITE_MMAP_SIZE = config("SQLITE_MMAP_SIZE", cast=int, default=268435456)  # bytes
+# pages, or KiB if negative
+SQLITE_CACHE_SIZE = config("SQLITE_CACHE_SIZE", cast=int, default=-64000)
 CELERY_BROKER_URL = config("CELERY_BROKER_URL", default="redis://127.0.0.1:6379")
+CELERY_RESULT_BACKEND = config("CELERY_RESULT_BACKEND", default=CELERY_BROKER_URL)
 ADMIN_USERNAME = config("ADMIN_USERNAME", default="admin")
 ADMIN_PASSWORD = config("ADMIN_PASSWORD", default="password")
 TIME_ZONE = config("TIME_ZONE", default="UTC")
 LOG_LEVEL = config("LOG_LEVEL", default="ERROR")
 LOG_FILE_ROTATION = config("LOG_FILE_ROTATION", default="50 MB")
+BILLING_BATCH_SIZE = config("BILLING_BATCH_SIZE", cast=int, default=500)
+BILLING_SHARDS = config("BILLING_SHARDS", cast=int, default=8)
+BILLING_SCHEDULE = config("BILLING_SCHEDULE", default="daily")  # daily | hourly
+BILLING_LEASE_TTL = config("BILLING_LEASE_TTL", cast=int, default=300)  # seconds
+BILLING_LEASE_WAIT = config("BILLING_LEASE_WAIT", cast=int, default=0)  # seconds
+REALTIME_BILLING = config("REALTIME_BILLING", cast=bool, default=False)
+# hours ahead of its due date a new subscription is queued for billing,
+# also raises the Redis visibility timeout to the horizon + 1 hour
+REALTIME_BILLING_HORIZON = config("REALTIME_BILLING_HORIZON", cast=int, default=24)
+# minutes, 0 = off, also raises the Redis visibility timeout to the window + 1 hour
+BILLING_WINDOW = config("BILLING_WINDOW", cast=int, default=0)
+# invoices per second of all the shards of a run, 0 = off. Without BILLING_WINDOW
+# the shards share it, with it each slot gets it whole and must finish in its slot
+BILLING_RATE_LIMIT = config("BILLING_RATE_LIMIT", cast=float, default=0)
+# run the billing runs requested from the API on a Celery worker, else in the API
+BILLING_RUNS_CELERY = config("BILLING_RUNS_CELERY", cast=bool, default=False)
+EMBEDDED_SCHEDULER = config("EMBEDDED_SCHEDULER", cast=bool, default=False)
+# seconds between two checks of the due jobs
+EMBEDDED_SCHEDULER_INTERVAL = config(
+    "EMBEDDED_SCHEDULER_INTERVAL", cast=int, default=60
+)
+BILLING_TENANT_FAIR = config("BILLING_TENANT_FAIR", cast=bool, default=False)
+AUTH_CACHE_TTL = config("AUTH_CACHE_TTL", cast=int, default=300)  # seconds
+AUTH_CACHE_SIZE = config("AUTH_CACHE_SIZE", cast=int, default=1024)  # 0 = off
+SECRET_KEY = config("SECRET_KEY", default="")  # signs the access tokens
+ACCESS_TOKEN_TTL = config("ACCESS_TOKEN_TTL", cast=int, default=900)  # seconds
+BCRYPT_ROUNDS = config("BCRYPT_ROUNDS", cast=int, default=12)
@@ -1,8 +1,9 @@
 from datetime import date, datetime, timezone
 from typing import Annotated, Literal
 
-from fastapi import APIRouter, Query, status
+from fastapi import APIRouter, BackgroundTasks, Query, status
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
 from sqlmodel import select
 
 from app.database.deps import CurrentTenant, SessionDep
@@ -21,15 +22,28 @@ from app.database.models import (
 from app.exceptions import BadRequestError, NotFoundError
 from app.logging import log_operation
 from app.responses import responses
+from app.scheduler import enqueue_subscription_invoice
 from app.subscriptions.billing_day import get_billing_day
 from app.subscriptions.phases import create_phases
+from app.subscriptions.schedule import get_due_date, schedule_subscription
 
 router = APIRouter(prefix="/subscriptions", responses=responses)
 
+# Relationships of SubscriptionPublicWithAccountAndCustomFields, loaded with
+# the subscription since the async session does not lazy load
+with_account_and_custom_fields = (
+    selectinload(Subscription.account),
+    selectinload(Subscription.products),
+    selectinload(Subscription.custom_fields),
+)
+
 
 @router.post("/", status_code=status.HTTP_201_CREATED)
 async def create_subscription(
-    subscription: SubscriptionCreate, session: SessionDep, current_tenant: CurrentTenant
+    subscription: SubscriptionCreate,
+    background_tasks: BackgroundTasks,
+    session: SessionDep,
+    current_tenant: CurrentTenant,
 ) -> SubscriptionPublic:
 
     log_operation(
@@ -91,10 +105,12 @@ async def create_subscription(
             detail="trial_time is required if trial_time_unit is provided"
         )
 
-    if not session.exec(
-        select(Account).where(
-            Account.id == subscription.account_id,
-            Account.tenant_id == current_tenant.id,
+    if not (
+        await session.exec(
+            select(Account).where(
+                Account.id == subscription.account_id,
+                Account.tenant_id == current_tenant.id,
+            )
         )
     ).first():
 
@@ -110,10 +126,12 @@ async def create_subscription(
 
     for product in subscription.products:
 
-        if not session.exec(
-            select(Product).where(
-                Product.id == product.product_id,
-                Product.tenant_id == current_tenant.id,
+        if not (
+            await session.exec(
+                select(Product).where(
+                    Product.id == product.product_id,
+                    Product.tenant_id == current_tenant.id,
+                )
             )
         ).first():
 
@@ -162,8 +180,16 @@ async def create_subscription(
     )
 
     try:
-        session.commit()
-        session.refresh(subscription_db)
+        await session.flush()
+        await session.run_sync(schedule_subscription, subscription_db)
+        due_date = get_due_date(subscription_db)
+        await session.commit()
+        await session.refresh(subscription_db)
+
+        # Off the event loop and after the response, the broker call blocks
+        background_tasks.add_task(
+            enqueue_subscription_invoice, subscription_db.id, due_date
+        )
 
         log_operation(
             operation="CREATE",
@@ -175,7 +201,7 @@ async def create_subscription(
 
         return subscription_db
     except IntegrityError as exc:
-        session.rollback()
+        await session.rollback()
 
         log_operation(
             operation="CREATE",
@@ -190,7 +216,7 @@ async def create_subscription(
 
 
 @router.get("/")
-def read_subscriptions(
+async def read_subscriptions(
     session: SessionDep,
     current_tenant: CurrentTenant,
     offset: int = 0,
@@ -226,7 +252,7 @@ def read_subscriptions(
             .limit(limit)
         )
 
-    subscriptions = session.exec(query).all()
+    subscriptions = (await session.exec(query)).all()
 
     log_operation(
         operation="READ",
@@ -240,7 +266,7 @@ def read_subscriptions(
 
 
 @router.get("/{subscription_id}")
-def read_subscription(
+async def read_subscription(
     subscription_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -254,10 +280,14 @@ def read_subscription(
         detail=f"subscription id {subscription_id}",
     )
 
-    subscription = session.exec(
-        select(Subscription).where(
-            Subscription.id == subscription_id,
-            Subscription.tenant_id == current_tenant.id,
+    subscription = (
+        await session.exec(
+            select(Subscription)
+            .options(*with_account_and_custom_fields)
+            .where(
+                Subscription.id == subscription_id,
+                Subscription.tenant_id == current_tenant.id,
+            )
         )
     ).first()
 
@@ -286,7 +316,7 @@ def read_subscription(
 
 
 @router.get("/external/{external_id}")
-def read_subscription_by_external_id(
+async def read_subscription_by_external_id(
     external_id: str,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -300,10 +330,14 @@ def read_subscription_by_external_id(
         detail=f"subscription external id {external_id}",
     )
 
-    subscription = session.exec(
-        select(Subscription).where(
-            Subscription.external_id == external_id,
-            Subscription.tenant_id == current_tenant.id,
+    subscription = (
+        await session.exec(
+            select(Subscription)
+            .options(*with_account_and_custom_fields)
+            .where(
+                Subscription.external_id == external_id,
+                Subscription.tenant_id == current_tenant.id,
+            )
         )
     ).first()
 
@@ -332,7 +366,7 @@ def read_subscription_by_external_id(
 
 
 @router.delete("/{subscription_id}", status_code=status.HTTP_200_OK)
-def cancel_subscription(
+async def cancel_subscription(
     subscription_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -347,10 +381,12 @@ def cancel_subscription(
         detail=f"subscription id {subscription_id}",
     )
 
-    subscription = session.exec(
-        select(Subscription).where(
-            Subscription.id == subscription_id,
-            Subscription.tenant_id == current_tenant.id,
+    subscription = (
+        await session.exec(
+            select(Subscription).where(
+                Subscription.id == subscription_id,
+                Subscription.tenant_id == current_tenant.id,
+            )
         )
     ).first()
 
@@ -388,8 +424,9 @@ def cancel_subscription(
 
     subscription.state = state
     subscription.end_date = end_date
-    session.commit()
-    session.refresh(subscription)
+    await session.run_sync(schedule_subscription, subscription)
+    await session.commit()
+    await session.refresh(subscription)
 
     log_operation(
         operation="DELETE",
@@ -403,7 +440,7 @@ def cancel_subscription(
 
 
 @router.put("/{subscription_id}/billing_day")
-def update_billing_day(
+async def update_billing_day(
     subscription_id: int,
     data: UpdateBillingDay,
     session: SessionDep,
@@ -418,10 +455,14 @@ def update_billing_day(
         detail=f"subscription id {subscription_id} data {data.model_dump()}",
     )
 
-    subscription = session.exec(
-        select(Subscription).where(
-            Subscription.id == subscription_id,
-            Subscription.tenant_id == current_tenant.id,
+    subscription = (
+        await session.exec(
+            select(Subscription)
+            .options(*with_account_and_custom_fields)
+            .where(
+                Subscription.id == subscription_id,
+                Subscription.tenant_id == current_tenant.id,
+            )
         )
     ).first()
 
@@ -455,8 +496,8 @@ def update_billing_day(
 
     subscription.billing_day = billing_day
 
-    session.commit()
-    session.refresh(subscription)
+    await session.commit()
+    await session.refresh(subscription)
 
     log_operation(
         operation="UPDATE",
@@ -470,7 +511,7 @@ def update_billing_day(
 
 
 @router.put("/{subscription_id}/pause")
-def pause_subscription(
+async def pause_subscription(
     subscription_id: int,
     session: SessionDep,
     current_tenant: CurrentTenant,
@@ -485,10 +526,14 @@ def pause_subscription(
         detail=f"subscription id {subscription_id} resume date {resume}",
     )
 
-    subscription = session.exec(
-        select(Subscription).where(
-            Subscription.id == subscription_id,
-            Subscription.tenant_id == current_tenant.id,
+    subscription = (
+        await session.exec(
+            select(Subscription)
+            .options(*with_account_and_custom_fields)
+            .where(
+                Subscription.id == subscription_id,
+                Subscription.tenant_id == current_tenant.id,
+            )
         )
     ).first()
 
@@ -526,9 +571,10 @@ def pause_subscription(
 
     subscription.state = state
     subscription.resume_date = resume
+    await session.run_sync(schedule_subscription, subscription)
 
-    session.commit()
-    session.refresh(subscription)
+    await session.commit()
+    await session.refresh(subscription)
 
     log_operation(
         operation="UPDATE",
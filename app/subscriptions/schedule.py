@@ -0,0 +1,163 @@
+from datetime import date
+from typing import Iterable, Tuple
+
+from sqlalchemy import delete, func, insert
+from sqlmodel import Session, select
+
+from app.database.deps import engine
+from app.database.models import (
+    BillingSchedule,
+    PhaseType,
+    State,
+    Subscription,
+    SubscriptionPhase,
+)
+
+
+def get_due_date(subscription: Subscription) -> date | None:
+    """Return the next date the subscription is due for invoice,
+    None if it is never billed -- e.g cancelled, paused or UNLIMITED trial
+
+    Args:
+        subscription (Subscription)
+    """
+
+    if subscription.state != State.ACTIVE:
+        return None
+
+    if subscription.next_billing_date:
+        return subscription.next_billing_date
+
+    evergreen_dates = [
+        phase.start_date
+        for phase in subscription.phases
+        if phase.phase == PhaseType.EVERGREEN
+    ]
+
+    return min(evergreen_dates, default=None)
+
+
+def schedule_subscriptions(
+    session: Session, rows: Iterable[Tuple[int, int, int, date | None]]
+):
+    """Replace the billing schedule of subscriptions.
+    The caller owns the transaction.
+
+    Args:
+        session (Session)
+        rows (Iterable[Tuple[int, int, int, date | None]]):
+            subscription id, account id, tenant id and due date,
+            a None due date removes the subscription from the schedule
+    """
+
+    rows = list(rows)
+
+    if not rows:
+        return
+
+    session.execute(
+        # pylint: disable=no-member
+        delete(BillingSchedule).where(
+            BillingSchedule.subscription_id.in_([row[0] for row in rows])
+        )
+    )
+
+    values = [
+        {
+            "subscription_id": subscription_id,
+            "account_id": account_id,
+            "tenant_id": tenant_id,
+            "due_date": due_date,
+        }
+        for subscription_id, account_id, tenant_id, due_date in rows
+        if due_date
+    ]
+
+    if values:
+        session.execute(insert(BillingSchedule), values)
+
+
+def schedule_subscription(session: Session, subscription: Subscription):
+    """Update the billing schedule of a subscription from its current state.
+    The caller owns the transaction.
+
+    Args:
+        session (Session)
+        subscription (Subscription)
+    """
+
+    schedule_subscriptions(
+        session,
+        [
+            (
+                subscription.id,
+                subscription.account_id,
+                subscription.tenant_id,
+                get_due_date(subscription),
+            )
+        ],
+    )
+
+
+def due_dates_select():
+    """Select the subscription id, account id, tenant id and due date
+    of the active subscriptions, like `get_due_date`"""
+
+    evergreen_start = (
+        select(
+            SubscriptionPhase.subscription_id,
+            func.min(SubscriptionPhase.start_date).label("start_date"),
+        )
+        .where(SubscriptionPhase.phase == PhaseType.EVERGREEN)
+        .group_by(SubscriptionPhase.subscription_id)
+        .subquery()
+    )
+
+    due_date = func.coalesce(
+        Subscription.next_billing_date, evergreen_start.c.start_date
+    )
+
+    return (
+        select(
+            Subscription.id,
+            Subscription.account_id,
+            Subscription.tenant_id,
+            due_date,
+        )
+        .join(
+            evergreen_start,
+            evergreen_start.c.subscription_id == Subscription.id,
+        )
+        .where(Subscription.state == State.ACTIVE)
+    )
+
+
+def rebuild_billing_schedule(session: Session):
+    """Rebuild the whole billing schedule from the subscriptions
+    with set-based statements
+
+    Args:
+        session (Session)
+    """
+
+    session.execute(delete(BillingSchedule))
+
+    session.execute(
+        insert(BillingSchedule).from_select(
+            ["subscription_id", "account_id", "tenant_id", "due_date"],
+            due_dates_select(),
+        )
+    )
+
+
+def init_billing_schedule():
+    """Build the billing schedule when it is empty -- e.g on a database
+    created before the schedule existed"""
+
+    with Session(engine) as session:
+
+        if session.exec(select(BillingSchedule)).first():
+            return
+
+        rebuild_billing_schedule(session)
+        session.commit()
@@ -0,0 +1,194 @@
+from datetime import date
+from typing import Dict, List
+
+from sqlalchemy import case, delete, func, insert, true, update
+from sqlmodel import Session, select
+
+from app.database.deps import engine
+from app.database.models import (
+    Account,
+    BillingPeriod,
+    BillingSchedule,
+    PhaseType,
+    State,
+    Subscription,
+    SubscriptionPhase,
+)
+from app.invoices.create import BILLING_PERIOD_MONTHS, add_billing_period, days_in_month
+from app.logging import log_operation
+from app.subscriptions.schedule import due_dates_select
+
+
+def resumed_billing_date(
+    billing_period: BillingPeriod, today: date, billing_day: int = None
+) -> date:
+    """Return the next billing date of a subscription resumed `today` whose
+    due date passed while it was paused: the next `billing_day` from today
+    for month based periods, else today
+
+    Args:
+        billing_period (BillingPeriod)
+        today (date)
+        billing_day (int, optional)
+    """
+
+    if billing_period not in BILLING_PERIOD_MONTHS or not billing_day:
+        return today
+
+    this_month = today.replace(
+        day=min(billing_day, days_in_month(today.year, today.month))
+    )
+
+    if this_month >= today:
+        return this_month
+
+    return add_billing_period(BillingPeriod.MONTHLY, this_month, billing_day)
+
+
+def sweep_subscriptions(
+    session: Session, today: date, timezones: List[str] = None
+) -> Dict[str, int]:
+    """Apply the state transitions due today with set-based statements:
+    subscriptions past their end date are cancelled and paused
+    subscriptions past their resume date are active again.
+    The billing schedule follows the new states. The caller owns the transaction.
+
+    Args:
+        session (Session)
+        today (date)
+        timezones (List[str], optional): only accounts in these timezones,
+            whose local date is `today`
+
+    Returns:
+        Dict[str, int]: subscriptions cancelled and resumed
+    """
+
+    in_timezones = true()
+
+    if timezones is not None:
+        in_timezones = Subscription.account_id.in_(
+            # pylint: disable=no-member
+            select(Account.id).where(Account.timezone.in_(timezones))
+        )
+
+    cancelled = session.execute(
+        update(Subscription)
+        .where(
+            Subscription.state != State.CANCELLED,
+            Subscription.end_date <= today,
+            in_timezones,
+        )
+        .values(state=State.CANCELLED),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+
+    to_resume = (
+        Subscription.state == State.PAUSED,
+        Subscription.resume_date <= today,
+        in_timezones,
+    )
+
+    # The schedule rows left from before the pause are rebuilt below
+    session.execute(
+        # pylint: disable=no-member
+        delete(BillingSchedule).where(
+            BillingSchedule.subscription_id.in_(
+                select(Subscription.id).where(*to_resume)
+            )
+        )
+    )
+
+    evergreen_start = (
+        # pylint: disable=not-callable
+        select(func.min(SubscriptionPhase.start_date))
+        .where(
+            SubscriptionPhase.subscription_id == Subscription.id,
+            SubscriptionPhase.phase == PhaseType.EVERGREEN,
+        )
+        .scalar_subquery()
+    )
+    due_date = func.coalesce(Subscription.next_billing_date, evergreen_start)
+
+    resumed = 0
+
+    # One UPDATE per billing period and day, a due date that passed during
+    # the pause moves to the next billing date from today
+    for billing_period, billing_day in session.execute(
+        select(Subscription.billing_period, Subscription.billing_day)
+        .where(*to_resume)
+        .distinct()
+    ).all():
+        same_billing_day = (
+            Subscription.billing_day == billing_day
+            if billing_day
+            else Subscription.billing_day.is_(None)
+        )
+
+        resumed += session.execute(
+            update(Subscription)
+            .where(
+                *to_resume,
+                Subscription.billing_period == billing_period,
+                same_billing_day,
+            )
+            .values(
+                state=State.ACTIVE,
+                resume_date=None,
+                next_billing_date=case(
+                    (
+                        due_date < today,
+                        resumed_billing_date(billing_period, today, billing_day),
+                    ),
+                    else_=Subscription.next_billing_date,
+                ),
+            ),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+
+    if cancelled:
+        session.execute(
+            # pylint: disable=no-member
+            delete(BillingSchedule).where(
+                BillingSchedule.subscription_id.in_(
+                    select(Subscription.id).where(Subscription.state != State.ACTIVE)
+                )
+            )
+        )
+
+    if resumed:
+        session.execute(
+            insert(BillingSchedule).from_select(
+                ["subscription_id", "account_id", "tenant_id", "due_date"],
+                due_dates_select().where(
+                    # pylint: disable=no-member
+                    Subscription.id.not_in(select(BillingSchedule.subscription_id))
+                ),
+            )
+        )
+
+    return {"cancelled": cancelled, "resumed": resumed}
+
+
+def run_sweep(today: date, timezones: List[str] = None) -> Dict[str, int]:
+    """Apply the state transitions due today, see `sweep_subscriptions`
+
+    Args:
+        today (date)
+        timezones (List[str], optional)
+
+    Returns:
+        Dict[str, int]: subscriptions cancelled and resumed
+    """
+
+    with Session(engine) as session:
+        result = sweep_subscriptions(session, today, timezones)
+        session.commit()
+
+    log_operation(
+        operation="UPDATE",
+        model="Subscription",
+        status="SUCCESS",
+        detail=f"sweep on {today}: {result}",
+    )
+
+    return result
@@ -1,6 +1,7 @@
 from typing import Annotated
 
 from fastapi import APIRouter, Query, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 
@@ -9,7 +10,7 @@ from app.database.models import Tenant, TenantBase, TenantPublic, TenantUpdate
 from app.exceptions import BadRequestError, NotFoundError
 from app.logging import log_operation
 from app.responses import responses
-from app.security import get_password_hash
+from app.security import get_password_hash, tenant_cache
 
 router = APIRouter(prefix="/tenants", responses=responses)
 
@@ -27,17 +28,18 @@ async def create_tenant(
         detail=tenant.model_dump(exclude={"api_secret"}),
     )
 
+    # bcrypt is CPU bound, keep it off the event loop
     tenant_db = Tenant.model_validate(
         tenant,
         update={
-            "api_secret": get_password_hash(tenant.api_secret),
+            "api_secret": await run_in_threadpool(get_password_hash, tenant.api_secret),
             "user_id": current_user.id,
         },
     )
     try:
         session.add(tenant_db)
-        session.commit()
-        session.refresh(tenant_db)
+        await session.commit()
+        await session.refresh(tenant_db)
 
         log_operation(
             operation="CREATE",
@@ -49,7 +51,7 @@ async def create_tenant(
 
         return tenant_db
     except IntegrityError as exc:
-        session.rollback()
+        await session.rollback()
 
         message = (
             "Api key already exists"
@@ -69,7 +71,7 @@ async def create_tenant(
 
 
 @router.get("/")
-def read_tenants(
+async def read_tenants(
     session: SessionDep,
     current_user: CurrentUser,
     offset: int = 0,
@@ -84,7 +86,7 @@ def read_tenants(
         detail=f"offset : {offset} limit: {limit}",
     )
 
-    tenants = session.exec(select(Tenant).offset(offset).limit(limit)).all()
+    tenants = (await session.exec(select(Tenant).offset(offset).limit(limit))).all()
 
     log_operation(
         operation="READ",
@@ -98,7 +100,7 @@ def read_tenants(
 
 
 @router.put("/{tenant_id}")
-def update_tenants(
+async def update_tenants(
     tenant_id: int,
     tenant: TenantUpdate,
     session: SessionDep,
@@ -113,7 +115,9 @@ def update_tenants(
         detail=f"tenant id {tenant_id} data {tenant.model_dump(exclude={'api_secret'})}",
     )
 
-    tenant_db = session.exec(select(Tenant).where(Tenant.id == tenant_id)).first()
+    tenant_db = (
+        await session.exec(select(Tenant).where(Tenant.id == tenant_id))
+    ).first()
 
     if not tenant_db:
 
@@ -130,14 +134,20 @@ def update_tenants(
     tenant_data = tenant.model_dump(exclude_unset=True)
 
     if tenant_data.get("api_secret"):
-        tenant_data["api_secret"] = get_password_hash(tenant.api_secret)
+        # bcrypt is CPU bound, keep it off the event loop
+        tenant_data["api_secret"] = await run_in_threadpool(
+            get_password_hash, tenant.api_secret
+        )
 
     tenant_db.sqlmodel_update(tenant_data)
 
     try:
         session.add(tenant_db)
-        session.commit()
-        session.refresh(tenant_db)
+        await session.commit()
+        await session.refresh(tenant_db)
+
+        if "api_key" in tenant_data or "api_secret" in tenant_data:
+            tenant_cache.invalidate(lambda verified: verified[0] == tenant_id)
 
         log_operation(
             operation="UPDATE",
@@ -149,7 +159,7 @@ def update_tenants(
 
         return tenant_db
     except IntegrityError as exc:
-        session.rollback()
+        await session.rollback()
 
         message = (
             "Api key already exists"
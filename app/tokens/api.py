@@ -0,0 +1,27 @@
+from fastapi import APIRouter, status
+
+from app.database.deps import CredentialsTenant
+from app.database.models import AccessToken
+from app.logging import log_operation
+from app.responses import responses
+from app.security import create_access_token
+
+router = APIRouter(prefix="/tokens", responses=responses)
+
+
+@router.post("/", status_code=status.HTTP_201_CREATED)
+async def create_token(current_tenant: CredentialsTenant) -> AccessToken:
+    """Exchange the tenant api key and secret for a short-lived access token,
+    sent as `Authorization: Bearer <token>` instead of the credentials"""
+
+    access_token, expires = create_access_token(current_tenant.id)
+
+    log_operation(
+        operation="CREATE",
+        model="AccessToken",
+        status="SUCCESS",
+        tenant_id=current_tenant.id,
+        detail=f"expires {expires.isoformat()}",
+    )
+
+    return AccessToken(access_token=access_token, expires=expires)
@@ -0,0 +1,123 @@
+"""Concurrency of the SQLite engine profile against the SQLAlchemy defaults.
+
+Several processes share one SQLite file, like the API, the Celery worker and
+beat in docker/docker-compose-sqlite.yml: writers insert rows in small
+transactions while readers count them. Each profile reports the writes and
+reads per second and the operations failed with "database is locked".
+
+Usage:
+    python -m benchmarks.engine_profile --writers 4 --readers 4 --seconds 10
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.exc import OperationalError
+
+from app.database.deps import get_engine_options, set_sqlite_pragmas
+
+PROFILES = ("default", "tuned")
+
+
+def make_engine(path: str, profile: str):
+
+    url = f"sqlite:///{path}"
+
+    if profile == "default":
+        return create_engine(url)
+
+    engine = create_engine(
+        url, connect_args={"check_same_thread": False}, **get_engine_options(url)
+    )
+    event.listen(engine, "connect", set_sqlite_pragmas)
+
+    return engine
+
+
+def work(path: str, profile: str, role: str, seconds: float) -> Dict[str, int]:
+
+    engine = make_engine(path, profile)
+    done = failed = 0
+    deadline = time.monotonic() + seconds
+
+    while time.monotonic() < deadline:
+        try:
+            with engine.begin() as connection:
+                if role == "writer":
+                    connection.execute(
+                        text("INSERT INTO item (value) VALUES (:value)"),
+                        {"value": "x" * 100},
+                    )
+                else:
+                    connection.execute(text("SELECT count(*) FROM item")).scalar()
+            done += 1
+        except OperationalError:
+            failed += 1
+
+    engine.dispose()
+
+    return {"role": role, "done": done, "failed": failed}
+
+
+def run(profile: str, writers: int, readers: int, seconds: float) -> Dict[str, float]:
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "benchmark.db")
+
+        engine = make_engine(path, profile)
+        with engine.begin() as connection:
+            connection.execute(
+                text("CREATE TABLE item (id INTEGER PRIMARY KEY, value TEXT)")
+            )
+        engine.dispose()
+
+        roles = ["writer"] * writers + ["reader"] * readers
+
+        with ProcessPoolExecutor(max_workers=len(roles)) as executor:
+            results = list(
+                executor.map(
+                    work,
+                    [path] * len(roles),
+                    [profile] * len(roles),
+                    roles,
+                    [seconds] * len(roles),
+                )
+            )
+
+    report = {"profile": profile, "writes": 0, "reads": 0, "locked": 0}
+
+    for result in results:
+        report["writes" if result["role"] == "writer" else "reads"] += result["done"]
+        report["locked"] += result["failed"]
+
+    report["writes"] /= seconds
+    report["reads"] /= seconds
+
+    return report
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"{'profile':<10}{'writes/s':>12}{'reads/s':>12}{'locked':>10}")
+
+    for profile in PROFILES:
+        report = run(profile, args.writers, args.readers, args.seconds)
+        print(
+            f"{report['profile']:<10}{report['writes']:>12.0f}"
+            f"{report['reads']:>12.0f}{report['locked']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+from fastapi.testclient import TestClient
+from passlib.hash import bcrypt
+from sqlmodel import select
+
+from app.database import deps
+from app.database.models import User
+from app.security import VerificationCache, get_password_hash
+from tests.conftest import AUTH_HEADERS
+
+
+def test_verification_cache():
+
+    cache = VerificationCache(maxsize=2, ttl=60)
+
+    key1, key2, key3 = cache.key("a", "1"), cache.key("a", "2"), cache.key("b", "1")
+
+    assert key1 != cache.key("a1", "")
+
+    cache.set(key1, 1)
+    cache.set(key2, 2)
+    assert cache.get(key1) == 1
+
+    cache.set(key3, 3)
+
+    # Least recently used
+    assert cache.get(key2) is None
+    assert cache.get(key1) == 1
+
+    cache.invalidate(lambda value: value == 1)
+    assert cache.get(key1) is None
+    assert cache.get(key3) == 3
+
+    expired = VerificationCache(maxsize=2, ttl=-1)
+    expired.set(key1, 1)
+    assert expired.get(key1) is None
+
+
+def test_tenant_verification_cached(client: TestClient, monkeypatch):
+
+    verify_password = deps.verify_password
+    calls = []
+
+    def count_verify_password(plain_password, hashed_password):
+        calls.append(plain_password)
+        return verify_password(plain_password, hashed_password)
+
+    monkeypatch.setattr(deps, "verify_password", count_verify_password)
+
+    for _ in range(3):
+        assert client.get("/v1/accounts", headers=AUTH_HEADERS).status_code == 200
+
+    assert calls == [AUTH_HEADERS["X-BillFlow-ApiSecret"]]
+
+    headers = {**AUTH_HEADERS, "X-BillFlow-ApiSecret": "wrong-secret"}
+    assert client.get("/v1/accounts", headers=headers).status_code == 401
+
+    response = client.put(
+        "/v1/tenants/1",
+        json={"api_secret": "secret-test-2"},
+        auth=("admin", "password"),
+    )
+    assert response.status_code == 200
+
+    assert client.get("/v1/accounts", headers=AUTH_HEADERS).status_code == 401
+
+    headers = {**AUTH_HEADERS, "X-BillFlow-ApiSecret": "secret-test-2"}
+    assert client.get("/v1/accounts", headers=headers).status_code == 200
+
+
+def test_user_verification_cached(client: TestClient, db, monkeypatch):
+
+    # Verified by the client fixture
+    deps.user_cache.clear()
+
+    verify_and_update_password = deps.verify_and_update_password
+    calls = []
+
+    def count_verify(plain_password, hashed_password):
+        calls.append(plain_password)
+        return verify_and_update_password(plain_password, hashed_password)
+
+    monkeypatch.setattr(deps, "verify_and_update_password", count_verify)
+
+    for _ in range(3):
+        assert client.get("/v1/tenants", auth=("admin", "password")).status_code == 200
+
+    assert calls == ["password"]
+    assert client.get("/v1/tenants", auth=("admin", "wrong")).status_code == 401
+
+    user = db.exec(select(User).where(User.username == "admin")).first()
+    user.password = get_password_hash("password-2")
+    db.add(user)
+    db.commit()
+
+    assert client.get("/v1/tenants", auth=("admin", "password")).status_code == 401
+    assert client.get("/v1/tenants", auth=("admin", "password-2")).status_code == 200
+
+    user.is_active = False
+    db.add(user)
+    db.commit()
+
+    assert client.get("/v1/tenants", auth=("admin", "password-2")).status_code == 401
+
+
+def test_user_password_rehashed(client: TestClient, db):
+
+    user = db.exec(select(User).where(User.username == "admin")).first()
+    user.password = bcrypt.using(rounds=4).hash("password")
+    db.add(user)
+    db.commit()
+
+    assert client.get("/v1/tenants", auth=("admin", "password")).status_code == 200
+
+    db.refresh(user)
+
+    assert not user.password.startswith("$2b$04$")
+    assert client.get("/v1/tenants", auth=("admin", "password")).status_code == 200
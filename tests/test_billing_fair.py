@@ -0,0 +1,149 @@
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+
+from app import scheduler
+from app.billing import runs
+from app.billing.fair import due_tenants, run_billing_fair
+from app.database.models import Account, Product, Tenant
+from tests.conftest import AUTH_HEADERS
+
+TENANT_2_HEADERS = {
+    "X-BillFlow-ApiSecret": "secret-test-2",
+    "X-BillFlow-ApiKey": "test-2",
+}
+
+
+def fill_db(client: TestClient, db):
+
+    response = client.post(
+        "/v1/tenants",
+        auth=("admin", "password"),
+        json={"name": "Test 2", "api_key": "test-2", "api_secret": "secret-test-2"},
+    )
+    assert response.status_code == 201
+
+    # Accounts 1 to 4 of tenant 1, account 5 of tenant 2
+    for i in range(1, 6):
+        db.add(
+            Account(
+                first_name=str(i),
+                email=f"test{i}@example.com",
+                tenant_id=1 if i < 5 else 2,
+            )
+        )
+    db.add(Product(name="product 1", price=10, is_available=True, tenant_id=1))
+    db.add(Product(name="product 2", price=10, is_available=True, tenant_id=2))
+    db.commit()
+
+    for account_id in range(1, 6):
+        payload = {
+            "account_id": account_id,
+            "products": [{"product_id": 1 if account_id < 5 else 2, "quantity": 1}],
+            "billing_period": "MONTHLY",
+        }
+        response = client.post(
+            "/v1/subscriptions",
+            json=payload,
+            headers=AUTH_HEADERS if account_id < 5 else TENANT_2_HEADERS,
+        )
+        assert response.status_code == 201
+
+
+def record_batches(monkeypatch):
+
+    monkeypatch.setattr(runs, "BILLING_BATCH_SIZE", 1)
+
+    bill_accounts = runs.bill_accounts
+    calls = []
+
+    def record(session, subscriptions_by_account, *args):
+        calls.append(list(subscriptions_by_account))
+        return bill_accounts(session, subscriptions_by_account, *args)
+
+    monkeypatch.setattr(runs, "bill_accounts", record)
+
+    return calls
+
+
+def test_run_billing_fair(client: TestClient, db, monkeypatch):
+
+    fill_db(client, db)
+
+    calls = record_batches(monkeypatch)
+    today = datetime.now(timezone.utc)
+
+    assert due_tenants(today) == {1: (1, None), 2: (1, None)}
+
+    assert run_billing_fair(today) == {
+        "accounts": 5,
+        "invoices": 5,
+        "subscriptions": 5,
+    }
+
+    # Tenant 2 is not billed after the 4 accounts of tenant 1
+    assert calls == [[1], [5], [2], [3], [4]]
+
+
+def test_run_billing_fair_weight(client: TestClient, db, monkeypatch):
+
+    fill_db(client, db)
+
+    tenant = db.get(Tenant, 1)
+    tenant.billing_weight = 2
+    db.add(tenant)
+    db.commit()
+
+    calls = record_batches(monkeypatch)
+
+    run_billing_fair(datetime.now(timezone.utc))
+
+    assert calls == [[1], [2], [5], [3], [4]]
+
+
+def test_run_billing_fair_concurrency(client: TestClient, db, monkeypatch):
+
+    fill_db(client, db)
+
+    response = client.put(
+        "/v1/tenants/1", json={"billing_concurrency": 1}, auth=("admin", "password")
+    )
+    assert response.status_code == 200
+    assert response.json()["billing_concurrency"] == 1
+
+    calls = record_batches(monkeypatch)
+    today = datetime.now(timezone.utc)
+
+    # Tenant 1 is only billed by the first shard
+    assert run_billing_fair(today, shard=1, shards=2)["accounts"] == 1
+    assert calls == [[5]]
+
+    assert run_billing_fair(today, shard=0, shards=2)["accounts"] == 4
+    assert calls == [[5], [1], [2], [3], [4]]
+
+
+def test_run_billing_fair_rate_limit(client: TestClient, db, monkeypatch):
+
+    fill_db(client, db)
+
+    monkeypatch.setattr(scheduler, "BILLING_TENANT_FAIR", True)
+    monkeypatch.setattr(runs, "BILLING_RATE_LIMIT", 1)
+    monkeypatch.setattr(runs, "BILLING_BATCH_SIZE", 1)
+
+    # Virtual clock, only advanced by the throttle
+    clock = [0.0]
+    delays = []
+
+    def sleep(seconds):
+        delays.append(seconds)
+        clock[0] += seconds
+
+    monkeypatch.setattr(runs.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(runs.time, "sleep", sleep)
+
+    today = datetime.now(timezone.utc)
+
+    assert scheduler.generate_invoices_shard(today.isoformat(), 0, 1)["invoices"] == 5
+
+    # 5 invoices of 2 tenants at 1 invoice per second
+    assert delays == [0, 1, 1, 1, 1]
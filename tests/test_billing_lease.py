@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app.billing import runs
+from app.billing.lease import (
+    LeaseHeld,
+    LeaseLost,
+    acquire_lease,
+    hold_lease,
+    release_lease,
+    renew_lease,
+)
+from app.database.models import BillingLease, BillingRun, BillingRunStatus, Invoice
+from tests.test_scheduler import fill_db
+
+
+def expire_lease(db, name: str):
+
+    lease = db.get(BillingLease, name)
+    lease.expires = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.add(lease)
+    db.commit()
+
+
+def test_lease(client: TestClient, db):
+
+    assert acquire_lease("billing", "worker-1")
+    assert acquire_lease("billing", "worker-1")
+    assert not acquire_lease("billing", "worker-2")
+    assert renew_lease("billing", "worker-1")
+
+    expire_lease(db, "billing")
+
+    # Stale lease taken over
+    assert acquire_lease("billing", "worker-2")
+    assert not renew_lease("billing", "worker-1")
+
+    release_lease("billing", "worker-1")
+    assert not acquire_lease("billing", "worker-1")
+
+    release_lease("billing", "worker-2")
+    assert acquire_lease("billing", "worker-1")
+
+
+def test_hold_lease(client: TestClient, db):
+
+    with hold_lease("billing") as heartbeat:
+        heartbeat()
+
+        with pytest.raises(LeaseHeld):
+            with hold_lease("billing"):
+                pass
+
+        expire_lease(db, "billing")
+
+        with hold_lease("billing"):
+            with pytest.raises(LeaseLost):
+                heartbeat()
+
+    assert db.exec(select(BillingLease)).first() is None
+
+
+def test_run_billing_with_held_lease(client: TestClient, db):
+
+    fill_db(client, db)
+
+    today = datetime.now(timezone.utc)
+
+    billing_run = runs.get_or_create_billing_run(db, today)
+    lease_name = runs.billing_lease_name(today.date())
+
+    assert acquire_lease(lease_name, "worker-1")
+
+    assert runs.run_billing(today) == {"accounts": 0, "invoices": 0, "subscriptions": 0}
+    assert db.exec(select(Invoice)).first() is None
+
+    # A catch-up run of the same date and shard waits for the lease too
+    assert runs.run_billing(today, since=today.date()) == {
+        "accounts": 0,
+        "invoices": 0,
+        "subscriptions": 0,
+    }
+
+    expire_lease(db, lease_name)
+
+    assert runs.run_billing(today) == {"accounts": 3, "invoices": 3, "subscriptions": 4}
+
+    db.refresh(billing_run)
+
+    assert billing_run.status == BillingRunStatus.COMPLETED
+    assert db.exec(select(BillingLease)).first() is None
+
+
+def test_run_billing_lease_lost(client: TestClient, db, monkeypatch):
+
+    fill_db(client, db)
+
+    monkeypatch.setattr(runs, "BILLING_BATCH_SIZE", 1)
+
+    bill_accounts = runs.bill_accounts
+
+    today = datetime.now(timezone.utc)
+    lease_name = runs.billing_lease_name(today.date())
+
+    def take_over_during_first_batch(session, subscriptions_by_account, *args):
+        if subscriptions_by_account == {1: [1]}:
+            expire_lease(db, lease_name)
+            assert acquire_lease(lease_name, "worker-2")
+        return bill_accounts(session, subscriptions_by_account, *args)
+
+    monkeypatch.setattr(runs, "bill_accounts", take_over_during_first_batch)
+
+    assert runs.run_billing(today) == {"accounts": 1, "invoices": 1, "subscriptions": 1}
+
+    billing_run = db.get(BillingRun, 1)
+
+    assert billing_run.status == BillingRunStatus.RUNNING
+    assert billing_run.last_account_id == 1
@@ -0,0 +1,37 @@
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app.billing.__main__ import main
+from app.billing.local import run_billing_local
+from app.database.models import BillingRun, Invoice
+from tests.test_scheduler import fill_db
+
+
+def test_run_billing_local(client: TestClient, db, capsys):
+
+    fill_db(client, db)
+
+    main(["run", "--workers", "2", "--tenant", "1"])
+
+    output = capsys.readouterr().out
+
+    assert "3 invoice(s) for 3 account(s) and 4 subscription(s)" in output
+    assert "bill:" in output
+
+    runs = db.exec(select(BillingRun).order_by(BillingRun.shard)).all()
+
+    assert [(run.shard, run.shards, run.tenant_id) for run in runs] == [
+        (0, 2, 1),
+        (1, 2, 1),
+    ]
+
+    invoices = db.exec(select(Invoice).order_by(Invoice.account_id)).all()
+
+    assert [invoice.account_id for invoice in invoices] == [1, 2, 3]
+
+    report = run_billing_local(datetime.now(timezone.utc), workers=3)
+
+    assert report["accounts"] == 0
+    assert report["invoices"] == 0
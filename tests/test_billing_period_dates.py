@@ -0,0 +1,52 @@
+from datetime import date, timedelta
+
+from app.database.models import BillingPeriod
+from app.invoices.create import (
+    calculate_date_from_billing_period,
+    calculate_dates_from_billing_periods,
+)
+
+
+def test_calculate_date_from_billing_period_billing_day():
+
+    assert calculate_date_from_billing_period(
+        BillingPeriod.MONTHLY, date(2025, 1, 31)
+    ) == date(2025, 2, 28)
+    assert calculate_date_from_billing_period(
+        BillingPeriod.MONTHLY, date(2025, 2, 28), 31
+    ) == date(2025, 3, 31)
+    assert calculate_date_from_billing_period(
+        BillingPeriod.ANNUAL, date(2024, 2, 29), 29
+    ) == date(2025, 2, 28)
+    assert calculate_date_from_billing_period(
+        BillingPeriod.WEEKLY, date(2025, 1, 31), 5
+    ) == date(2025, 2, 7)
+
+
+def test_calculate_dates_from_billing_periods():
+
+    billing_periods = []
+    dates = []
+    billing_days = []
+
+    for billing_period in BillingPeriod:
+        for days in range(0, 4 * 366, 3):
+            for billing_day in (None, 1, 15, 29, 30, 31):
+                billing_periods.append(billing_period)
+                dates.append(date(2023, 1, 1) + timedelta(days=days))
+                billing_days.append(billing_day)
+
+    expected = [
+        calculate_date_from_billing_period(*args)
+        for args in zip(billing_periods, dates, billing_days)
+    ]
+
+    assert (
+        calculate_dates_from_billing_periods(billing_periods, dates, billing_days)
+        == expected
+    )
+
+    assert calculate_dates_from_billing_periods(billing_periods, dates) == [
+        calculate_date_from_billing_period(*args)
+        for args in zip(billing_periods, dates)
+    ]
@@ -0,0 +1,240 @@
+from datetime import date, datetime, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app.billing import runs
+from app.database.models import (
+    Account,
+    BillingPeriod,
+    BillingRun,
+    BillingRunStatus,
+    Invoice,
+    InvoiceItem,
+    Product,
+    Subscription,
+)
+from app.invoices.bulk import billing_dates
+from app.invoices.create import create_invoice
+from tests.conftest import AUTH_HEADERS
+from tests.test_scheduler import fill_db
+
+
+def test_run_billing(client: TestClient, db):
+
+    fill_db(client, db)
+
+    today = datetime.now(timezone.utc)
+
+    assert runs.run_billing(today) == {"accounts": 3, "invoices": 3, "subscriptions": 4}
+
+    billing_run = db.exec(select(BillingRun)).one()
+
+    assert billing_run.status == BillingRunStatus.COMPLETED
+    assert billing_run.last_account_id == 3
+    assert billing_run.finished is not None
+
+    assert runs.run_billing(today) == {"accounts": 3, "invoices": 3, "subscriptions": 4}
+    assert len(db.exec(select(Invoice)).all()) == 3
+
+
+def test_run_billing_same_day_subscriptions(client: TestClient, db):
+
+    fill_db(client, db)
+
+    # Subscription 3 of account 2 was invoiced today, subscription 2 is still due
+    create_invoice(2, [3])
+
+    today = datetime.now(timezone.utc)
+
+    # Counts the rows written, not the batch
+    assert runs.run_billing(today) == {"accounts": 3, "invoices": 3, "subscriptions": 3}
+
+    db.expire_all()
+
+    subscription2, subscription3 = db.get(Subscription, 2), db.get(Subscription, 3)
+
+    assert subscription2.charged_through_date == today.date()
+    assert subscription2.next_billing_date == subscription3.next_billing_date
+    assert len(db.exec(select(Invoice).where(Invoice.account_id == 2)).all()) == 2
+    assert len(db.exec(select(InvoiceItem)).all()) == 4
+
+
+def test_get_or_create_billing_run(client: TestClient, db):
+
+    today = datetime.now(timezone.utc)
+
+    billing_run = runs.get_or_create_billing_run(db, today, 1, 2)
+
+    assert billing_run.key == runs.billing_run_key(today.date(), 1, 2)
+    assert runs.get_or_create_billing_run(db, today, 1, 2).id == billing_run.id
+    assert runs.get_or_create_billing_run(db, today, 0, 2).id != billing_run.id
+    assert len(db.exec(select(BillingRun)).all()) == 2
+
+
+def test_run_billing_resume_from_checkpoint(client: TestClient, db, monkeypatch):
+
+    fill_db(client, db)
+
+    monkeypatch.setattr(runs, "BILLING_BATCH_SIZE", 1)
+
+    bill_accounts = runs.bill_accounts
+    calls = []
+
+    def crash_on_second_batch(session, subscriptions_by_account, *args):
+        calls.append(list(subscriptions_by_account))
+        if len(calls) == 2:
+            raise RuntimeError("worker lost")
+        return bill_accounts(session, subscriptions_by_account, *args)
+
+    monkeypatch.setattr(runs, "bill_accounts", crash_on_second_batch)
+
+    today = datetime.now(timezone.utc)
+
+    with pytest.raises(RuntimeError):
+        runs.run_billing(today)
+
+    billing_run = db.exec(select(BillingRun)).one()
+
+    assert billing_run.status == BillingRunStatus.FAILED
+    assert billing_run.failures == 1
+    assert billing_run.last_account_id == 1
+    assert billing_run.accounts_processed == 1
+
+    assert runs.run_billing(today) == {"accounts": 3, "invoices": 3, "subscriptions": 4}
+    assert calls == [[1], [2], [2], [3]]
+
+    invoices = db.exec(select(Invoice).order_by(Invoice.account_id)).all()
+
+    assert [invoice.account_id for invoice in invoices] == [1, 2, 3]
+
+
+def test_run_billing_rate_limit(client: TestClient, db, monkeypatch):
+
+    fill_db(client, db)
+
+    monkeypatch.setattr(runs, "BILLING_BATCH_SIZE", 1)
+    monkeypatch.setattr(runs, "BILLING_RATE_LIMIT", 0.5)
+
+    delays = []
+    monkeypatch.setattr(runs.time, "sleep", delays.append)
+
+    assert runs.run_billing(datetime.now(timezone.utc)) == {
+        "accounts": 3,
+        "invoices": 3,
+        "subscriptions": 4,
+    }
+
+    # 2 seconds per invoice already created
+    assert delays[0] == 0
+    assert 1 < delays[1] <= 2
+    assert 3 < delays[2] <= 4
+
+
+def test_run_billing_rate_limit_shards(client: TestClient, db, monkeypatch):
+
+    fill_db(client, db)
+
+    monkeypatch.setattr(runs, "BILLING_BATCH_SIZE", 1)
+    monkeypatch.setattr(runs, "BILLING_RATE_LIMIT", 0.5)
+
+    delays = []
+    monkeypatch.setattr(runs.time, "sleep", delays.append)
+
+    # Accounts 1 and 3
+    runs.run_billing(datetime.now(timezone.utc), shard=1, shards=2)
+
+    # The limit is shared by the 2 shards, 4 seconds per invoice
+    assert delays[0] == 0
+    assert 3 < delays[1] <= 4
+
+
+def test_shard_rate_limit(monkeypatch):
+
+    monkeypatch.setattr(runs, "BILLING_RATE_LIMIT", 8)
+
+    # The shards start together and share the limit
+    assert runs.shard_rate_limit(4, 0) == 2
+
+    # One slot after the other, each gets the whole limit
+    assert runs.shard_rate_limit(4, 120) == 8
+
+
+def test_run_billing_catch_up(client: TestClient, db):
+
+    db.add(
+        Account(first_name="1", external_id=1, email="test@example.com", tenant_id=1)
+    )
+    db.add(Product(name="product 1", price=10, is_available=True, tenant_id=1))
+    db.commit()
+
+    for billing_period in ("DAILY", "WEEKLY", "MONTHLY"):
+        payload = {
+            "account_id": 1,
+            "products": [{"product_id": 1, "quantity": 1}],
+            "billing_period": billing_period,
+            "start_date": "2025-01-01",
+        }
+        response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+        assert response.status_code == 201
+
+    assert runs.run_billing(datetime(2025, 1, 1)) == {
+        "accounts": 1,
+        "invoices": 1,
+        "subscriptions": 3,
+    }
+
+    # No run between 2025-01-02 and 2025-01-09
+    assert runs.run_billing(datetime(2025, 1, 10), since=date(2025, 1, 2)) == {
+        "accounts": 1,
+        "invoices": 9,
+        "subscriptions": 2,
+    }
+
+    invoices = db.exec(
+        select(Invoice).where(Invoice.billing_date > date(2025, 1, 1))
+    ).all()
+
+    assert [invoice.billing_date for invoice in invoices] == [
+        date(2025, 1, day) for day in range(2, 11)
+    ]
+
+    items = db.exec(select(InvoiceItem)).all()
+    assert len(items) == 3 + 9 + 1
+
+    db.expire_all()
+
+    daily, weekly, monthly = db.exec(select(Subscription)).all()
+
+    assert daily.charged_through_date == date(2025, 1, 10)
+    assert daily.next_billing_date == date(2025, 1, 11)
+    assert weekly.charged_through_date == date(2025, 1, 8)
+    assert weekly.next_billing_date == date(2025, 1, 15)
+    assert monthly.charged_through_date == date(2025, 1, 1)
+    assert monthly.next_billing_date == date(2025, 2, 1)
+
+    assert db.get(Account, 1).credit == -10 * 13
+
+
+def test_billing_dates():
+
+    assert billing_dates(
+        BillingPeriod.WEEKLY,
+        date(2025, 1, 1),
+        None,
+        date(2025, 1, 20),
+        date(2025, 1, 5),
+    ) == ([date(2025, 1, 8), date(2025, 1, 15)], date(2025, 1, 22))
+
+    assert billing_dates(
+        BillingPeriod.DAILY,
+        date(2025, 1, 1),
+        date(2025, 1, 3),
+        date(2025, 1, 5),
+        date(2025, 1, 1),
+    ) == ([date(2025, 1, 1), date(2025, 1, 2)], date(2025, 1, 6))
+
+    assert billing_dates(
+        BillingPeriod.MONTHLY, date(2025, 1, 1), None, date(2025, 1, 5)
+    ) == ([date(2025, 1, 5)], date(2025, 2, 5))
@@ -0,0 +1,128 @@
+import json
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app import scheduler
+from app.database.models import BillingRun, Invoice
+from tests.test_scheduler import fill_db
+
+AUTH = ("admin", "password")
+
+
+def test_auth_error(client: TestClient):
+
+    clients = {
+        client.post: "/v1/billing-runs",
+        client.get: "/v1/billing-runs",
+    }
+
+    for cli, url in clients.items():
+        assert cli(url=url).status_code == 401
+        assert cli(url=url, auth=("admin", "12345abcd")).status_code == 401
+
+
+def test_create_billing_run(client: TestClient, db):
+
+    fill_db(client, db)
+
+    response = client.post("/v1/billing-runs", json={"account_id": 2}, auth=AUTH)
+
+    assert response.status_code == 202
+    assert response.json()["account_id"] == 2
+
+    billing_run_id = response.json()["id"]
+
+    invoices = db.exec(select(Invoice)).all()
+    assert [invoice.account_id for invoice in invoices] == [2]
+
+    response = client.get(f"/v1/billing-runs/{billing_run_id}", auth=AUTH)
+
+    assert response.status_code == 200
+    assert response.json()["status"] == "COMPLETED"
+    assert response.json()["accounts_processed"] == 1
+    assert response.json()["invoices_created"] == 1
+    assert response.json()["subscriptions_billed"] == 2
+    assert response.json()["failures"] == 0
+
+    response = client.post("/v1/billing-runs", json={"tenant_id": 1}, auth=AUTH)
+
+    assert response.status_code == 202
+    assert len(db.exec(select(Invoice)).all()) == 3
+
+    response = client.get("/v1/billing-runs", auth=AUTH)
+
+    assert [run["tenant_id"] for run in response.json()] == [1, None]
+
+    response = client.get("/v1/billing-runs?status=FAILED", auth=AUTH)
+
+    assert response.json() == []
+
+
+def test_create_billing_run_celery(client: TestClient, db, monkeypatch):
+
+    fill_db(client, db)
+
+    monkeypatch.setattr(scheduler.app.conf, "task_always_eager", True)
+    monkeypatch.setattr(scheduler, "BILLING_RUNS_CELERY", True)
+
+    queued = []
+    apply_async = scheduler.generate_billing_run.apply_async
+
+    def record(args, **kwargs):
+        queued.append(args)
+        return apply_async(args, **kwargs)
+
+    monkeypatch.setattr(scheduler.generate_billing_run, "apply_async", record)
+
+    response = client.post("/v1/billing-runs", json={"account_id": 2}, auth=AUTH)
+
+    assert response.status_code == 202
+    today = datetime.now(timezone.utc).date()
+
+    assert queued == [(f"{today.isoformat()}T00:00:00", None, None, 2)]
+    assert [invoice.account_id for invoice in db.exec(select(Invoice)).all()] == [2]
+
+
+def test_create_billing_run_error(client: TestClient, db):
+
+    fill_db(client, db)
+
+    response = client.post("/v1/billing-runs", json={"tenant_id": 2}, auth=AUTH)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Tenant not exists"
+
+    response = client.post("/v1/billing-runs", json={"account_id": 10}, auth=AUTH)
+
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Account not exists"
+
+    assert db.exec(select(BillingRun)).first() is None
+
+    response = client.get("/v1/billing-runs/1", auth=AUTH)
+
+    assert response.status_code == 404
+
+
+def test_stream_billing_run(client: TestClient, db):
+
+    fill_db(client, db)
+
+    billing_run_id = client.post("/v1/billing-runs", json={}, auth=AUTH).json()["id"]
+
+    with client.stream(
+        "GET", f"/v1/billing-runs/{billing_run_id}/events", auth=AUTH
+    ) as response:
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = [
+            json.loads(line.removeprefix("data: "))
+            for line in response.iter_lines()
+            if line.startswith("data: ")
+        ]
+
+    assert len(events) == 1
+    assert events[0]["status"] == "COMPLETED"
+    assert events[0]["invoices_created"] == 3
@@ -0,0 +1,83 @@
+from datetime import datetime, timezone
+
+from dateutil.relativedelta import relativedelta
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app.database.models import Account, BillingSchedule, Product
+from app.invoices.create import create_invoice
+from app.subscriptions.schedule import rebuild_billing_schedule
+from tests.conftest import AUTH_HEADERS
+
+
+def fill_db(client: TestClient, db):
+
+    db.add(
+        Account(first_name="1", external_id=1, email="test@example.com", tenant_id=1)
+    )
+    db.commit()
+
+    db.add(Product(name="product 1", price=30, is_available=True, tenant_id=1))
+    db.commit()
+
+    payloads = [
+        {"billing_period": "MONTHLY"},
+        {"billing_period": "MONTHLY", "trial_time_unit": "DAYS", "trial_time": 10},
+        {"billing_period": "MONTHLY", "trial_time_unit": "UNLIMITED"},
+        {"billing_period": "WEEKLY"},
+    ]
+
+    for payload in payloads:
+        payload.update({"account_id": 1, "products": [{"product_id": 1}]})
+
+        response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+
+        assert response.status_code == 201
+
+
+def read_schedule(db):
+
+    db.expire_all()
+
+    return {
+        schedule.subscription_id: schedule.due_date
+        for schedule in db.exec(select(BillingSchedule)).all()
+    }
+
+
+def test_billing_schedule(client: TestClient, db):
+
+    today = datetime.now(timezone.utc).date()
+
+    fill_db(client, db)
+
+    assert read_schedule(db) == {
+        1: today,
+        2: today + relativedelta(days=11),
+        4: today,
+    }
+
+    create_invoice(1, [1])
+
+    assert read_schedule(db)[1] == today + relativedelta(months=1)
+
+    response = client.put("/v1/subscriptions/4/pause", headers=AUTH_HEADERS)
+    assert response.status_code == 200
+    assert 4 not in read_schedule(db)
+
+    response = client.put(
+        "/v1/subscriptions/4/pause", params={"resume": today}, headers=AUTH_HEADERS
+    )
+    assert response.status_code == 200
+    assert read_schedule(db)[4] == today
+
+    response = client.delete("/v1/subscriptions/2", headers=AUTH_HEADERS)
+    assert response.status_code == 200
+    assert 2 not in read_schedule(db)
+
+    schedule = read_schedule(db)
+
+    rebuild_billing_schedule(db)
+    db.commit()
+
+    assert read_schedule(db) == schedule
@@ -0,0 +1,95 @@
+from datetime import date, datetime, timezone
+
+from fastapi.testclient import TestClient
+from freezegun import freeze_time
+from sqlmodel import select
+
+from app.billing.runs import run_billing
+from app.billing.timezones import bucket_timezones, timezones_at_midnight
+from app.database.models import Account, Invoice, Product
+from app.scheduler import app, generate_invoices_hourly
+from tests.conftest import AUTH_HEADERS
+
+TIMEZONES = ["America/New_York", "America/Toronto", "Asia/Tokyo", "UTC"]
+
+
+def fill_db(client: TestClient, db):
+
+    for i, name in enumerate(TIMEZONES, start=1):
+        db.add(
+            Account(
+                first_name=str(i),
+                external_id=i,
+                email=f"test{i}@example.com",
+                timezone=name,
+                tenant_id=1,
+            )
+        )
+    db.add(Product(name="product 1", price=10, is_available=True, tenant_id=1))
+    db.commit()
+
+    for account_id in range(1, len(TIMEZONES) + 1):
+        payload = {
+            "account_id": account_id,
+            "products": [{"product_id": 1, "quantity": 1}],
+            "billing_period": "MONTHLY",
+            "start_date": "2025-01-01",
+        }
+        response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+        assert response.status_code == 201
+
+
+def test_bucket_timezones():
+
+    now = datetime(2025, 1, 15, 5, tzinfo=timezone.utc)
+
+    buckets = bucket_timezones(TIMEZONES + ["Unknown/Zone"], now)
+
+    assert buckets == {
+        -300: (date(2025, 1, 15), ["America/New_York", "America/Toronto"]),
+        540: (date(2025, 1, 15), ["Asia/Tokyo"]),
+        0: (date(2025, 1, 15), ["UTC", "Unknown/Zone"]),
+    }
+
+
+def test_timezones_at_midnight(client: TestClient, db):
+
+    fill_db(client, db)
+
+    assert timezones_at_midnight(datetime(2025, 1, 15, 5, tzinfo=timezone.utc)) == {
+        -300: (date(2025, 1, 15), ["America/New_York", "America/Toronto"])
+    }
+    assert timezones_at_midnight(datetime(2025, 1, 15, 15, tzinfo=timezone.utc)) == {
+        540: (date(2025, 1, 16), ["Asia/Tokyo"])
+    }
+    assert timezones_at_midnight(datetime(2025, 1, 15, 12, tzinfo=timezone.utc)) == {}
+
+
+def test_run_billing_timezones(client: TestClient, db):
+
+    fill_db(client, db)
+
+    result = run_billing(
+        datetime(2025, 1, 15), timezones=["Asia/Tokyo"], utc_offset=540
+    )
+
+    assert result == {"accounts": 1, "invoices": 1, "subscriptions": 1}
+
+    invoices = db.exec(select(Invoice)).all()
+
+    assert [invoice.account_id for invoice in invoices] == [3]
+
+
+def test_generate_invoices_hourly(client: TestClient, db, monkeypatch):
+
+    monkeypatch.setattr(app.conf, "task_always_eager", True)
+
+    fill_db(client, db)
+
+    with freeze_time("2025-01-15 05:10:00"):
+        assert generate_invoices_hourly.delay(shards=2).get() == [-300]
+
+    invoices = db.exec(select(Invoice).order_by(Invoice.account_id)).all()
+
+    assert [invoice.account_id for invoice in invoices] == [1, 2]
+    assert {invoice.billing_date for invoice in invoices} == {date(2025, 1, 15)}
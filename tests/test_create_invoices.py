@@ -1,6 +1,12 @@
+from datetime import datetime, timezone
+
+from dateutil.relativedelta import relativedelta
 from fastapi.testclient import TestClient
+from sqlalchemy import event
 from sqlmodel import select
-from app.database.models import Account, Product, Invoice, InvoiceItem
+from app.database.deps import engine
+from app.database.models import Account, Product, Invoice, InvoiceItem, Subscription
+from app.invoices.bulk import create_invoices_bulk
 from app.invoices.create import create_invoice
 from tests.conftest import AUTH_HEADERS
 
@@ -124,3 +130,109 @@ def test_create_invoice_with_multiple_subscriptions(client: TestClient, db):
                 assert invoice_item.amount == 10
             elif invoice_item.product_id == 3:
                 assert invoice_item.amount == 0
+
+
+def count_selects(func, *args, **kwargs):
+
+    statements = []
+
+    def before_cursor_execute(
+        conn, cursor, statement, parameters, context, executemany
+    ):  # pylint: disable=unused-argument,too-many-arguments
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+
+    try:
+        func(*args, **kwargs)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    return len(statements)
+
+
+def test_create_invoice_constant_query_count(client: TestClient, db):
+
+    account1 = Account(
+        first_name="1", external_id=1, email="test@example.com", tenant_id=1
+    )
+    account2 = Account(
+        first_name="2", external_id=2, email="test2@example.com", tenant_id=1
+    )
+
+    db.add_all([account1, account2])
+    db.commit()
+
+    products = [
+        Product(name=f"product {i}", price=10, is_available=True, tenant_id=1)
+        for i in range(1, 4)
+    ]
+    db.add_all(products)
+    db.commit()
+
+    subscription_ids = {1: [], 2: []}
+
+    for account_id, count in ((1, 1), (2, 5)):
+        for _ in range(count):
+            data = {
+                "account_id": account_id,
+                "products": [
+                    {"product_id": 1, "quantity": 1},
+                    {"product_id": 2, "quantity": 2},
+                    {"product_id": 3, "quantity": 1},
+                ],
+                "billing_period": "MONTHLY",
+            }
+
+            response = client.post("/v1/subscriptions", json=data, headers=AUTH_HEADERS)
+
+            assert response.status_code == 201
+
+            subscription_ids[account_id].append(response.json()["id"])
+
+    one_subscription = count_selects(create_invoice, 1, subscription_ids[1])
+    five_subscriptions = count_selects(create_invoice, 2, subscription_ids[2])
+
+    assert one_subscription == five_subscriptions
+
+
+def test_create_invoice_honors_billing_day(client: TestClient, db):
+
+    account1 = Account(
+        first_name="1", external_id=1, email="test@example.com", tenant_id=1
+    )
+    account2 = Account(
+        first_name="2", external_id=2, email="test2@example.com", tenant_id=1
+    )
+    db.add_all([account1, account2])
+    db.add(Product(name="product 1", price=30, is_available=True, tenant_id=1))
+    db.commit()
+
+    for account_id in (1, 2):
+        data = {
+            "account_id": account_id,
+            "products": [{"product_id": 1, "quantity": 1}],
+            "billing_period": "MONTHLY",
+        }
+
+        response = client.post("/v1/subscriptions", json=data, headers=AUTH_HEADERS)
+        assert response.status_code == 201
+
+        response = client.put(
+            f"/v1/subscriptions/{response.json()['id']}/billing_day",
+            json={"billing_day": 31},
+            headers=AUTH_HEADERS,
+        )
+        assert response.status_code == 200
+
+    create_invoice(1, [1])
+    create_invoices_bulk({2: [2]})
+
+    today = datetime.now(timezone.utc).date()
+    expected = today + relativedelta(months=1, day=31)
+
+    db.expire_all()
+
+    assert db.get(Subscription, 1).next_billing_date == expected
+    assert db.get(Subscription, 2).next_billing_date == expected
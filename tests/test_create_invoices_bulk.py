@@ -0,0 +1,158 @@
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app.database.models import Account, Invoice, InvoiceItem, Product, Subscription
+from app.invoices.bulk import create_invoices_bulk
+from app.invoices.create import create_invoice
+from tests.conftest import AUTH_HEADERS
+
+
+def fill_db(client: TestClient, db):
+
+    account1 = Account(
+        first_name="1", external_id=1, email="test@example.com", tenant_id=1, credit=100
+    )
+    account2 = Account(
+        first_name="2",
+        external_id=2,
+        email="test2@example.com",
+        tenant_id=1,
+        credit=100,
+    )
+
+    db.add_all([account1, account2])
+    db.commit()
+
+    product1 = Product(name="product 1", price=30, is_available=True, tenant_id=1)
+    product2 = Product(name="product 2", price=10, is_available=True, tenant_id=1)
+    product3 = Product(name="product 3", price=50, is_available=False, tenant_id=1)
+
+    db.add_all([product1, product2, product3])
+    db.commit()
+
+    for account_id in (1, 2):
+        for billing_period in ("MONTHLY", "WEEKLY"):
+            data = {
+                "account_id": account_id,
+                "products": [
+                    {"product_id": 1, "quantity": 1},
+                    {"product_id": 2, "quantity": 2},
+                    {"product_id": 3, "quantity": 1},
+                ],
+                "billing_period": billing_period,
+            }
+
+            response = client.post("/v1/subscriptions", json=data, headers=AUTH_HEADERS)
+
+            assert response.status_code == 201
+
+
+def test_create_invoices_bulk_matches_create_invoice(client: TestClient, db):
+
+    fill_db(client, db)
+
+    invoice_id = create_invoice(1, [1, 2], skip_validation=True)
+    invoice_ids = create_invoices_bulk({2: [3, 4]})
+
+    today = datetime.now(timezone.utc).date()
+
+    assert list(invoice_ids.keys()) == [(2, today)]
+
+    db.expire_all()
+
+    items1 = db.exec(
+        select(InvoiceItem).where(InvoiceItem.invoice_id == invoice_id)
+    ).all()
+    items2 = db.exec(
+        select(InvoiceItem).where(InvoiceItem.invoice_id == invoice_ids[(2, today)])
+    ).all()
+
+    assert len(items1) == len(items2) == 6
+    assert sorted((i.product_id, i.quantity, i.amount) for i in items1) == sorted(
+        (i.product_id, i.quantity, i.amount) for i in items2
+    )
+    assert all(i.account_id == 2 and i.tenant_id == 1 for i in items2)
+
+    assert db.get(Account, 1).credit == db.get(Account, 2).credit == 0
+
+    subscriptions = db.exec(select(Subscription).order_by(Subscription.id)).all()
+
+    for subscription, bulk_subscription in zip(subscriptions[:2], subscriptions[2:]):
+        assert (
+            subscription.charged_through_date == bulk_subscription.charged_through_date
+        )
+        assert subscription.next_billing_date == bulk_subscription.next_billing_date
+
+
+def test_create_invoices_bulk_skip_foreign_subscriptions(client: TestClient, db):
+
+    fill_db(client, db)
+
+    invoice_ids = create_invoices_bulk({1: [1, 3], 99: [2]})
+
+    today = datetime.now(timezone.utc).date()
+
+    assert list(invoice_ids.keys()) == [(1, today)]
+
+    items = db.exec(
+        select(InvoiceItem).where(InvoiceItem.invoice_id == invoice_ids[(1, today)])
+    ).all()
+
+    assert {i.subscription_id for i in items} == {1}
+    assert len(db.exec(select(Invoice)).all()) == 1
+
+    db.expire_all()
+
+    assert db.get(Subscription, 2).next_billing_date is None
+    assert db.get(Subscription, 3).next_billing_date is None
+
+
+def test_create_invoices_idempotent(client: TestClient, db):
+
+    fill_db(client, db)
+
+    invoice_id = create_invoice(1, [1, 2], skip_validation=True)
+
+    assert create_invoice(1, [1, 2], skip_validation=True) is None
+    assert create_invoices_bulk({1: [1, 2]}) == {}
+
+    invoice_ids = create_invoices_bulk({2: [3, 4]})
+
+    assert len(invoice_ids) == 1
+    assert create_invoices_bulk({2: [3, 4]}) == {}
+
+    db.expire_all()
+
+    assert len(db.exec(select(Invoice)).all()) == 2
+    assert len(db.exec(select(InvoiceItem)).all()) == 12
+    assert db.get(Account, 1).credit == db.get(Account, 2).credit == 0
+
+
+def test_create_invoices_bulk_same_day_subscriptions(client: TestClient, db):
+
+    fill_db(client, db)
+
+    # Another subscription of the account was invoiced today
+    invoice_id = create_invoice(1, [2], skip_validation=True)
+
+    invoice_ids = create_invoices_bulk({1: [1, 2]})
+
+    today = datetime.now(timezone.utc).date()
+
+    assert list(invoice_ids.keys()) == [(1, today)]
+    assert invoice_ids[(1, today)] != invoice_id
+
+    items = db.exec(
+        select(InvoiceItem).where(InvoiceItem.invoice_id == invoice_ids[(1, today)])
+    ).all()
+
+    assert {i.subscription_id for i in items} == {1}
+
+    db.expire_all()
+
+    subscription = db.get(Subscription, 1)
+
+    assert subscription.charged_through_date == today
+    assert subscription.next_billing_date > today
@@ -3,7 +3,10 @@ from datetime import datetime, timezone
 from fastapi.testclient import TestClient
 
 from app.database.models import Account
-from app.invoices.utils import is_subscription_valid_for_invoice
+from app.invoices.utils import (
+    is_subscription_valid_for_invoice,
+    valid_subscription_ids_for_invoice,
+)
 from tests.conftest import AUTH_HEADERS
 
 
@@ -115,3 +118,27 @@ def test_is_subscription_valid_for_invoice_error_subs_deleted(client: TestClient
     assert response.status_code == 200
 
     assert is_subscription_valid_for_invoice(today, response.json()["id"]) is False
+
+
+def test_valid_subscription_ids_for_invoice(client: TestClient, db):
+
+    today = datetime.now(timezone.utc)
+
+    fill_db(client, db)
+
+    payloads = [
+        {"billing_period": "MONTHLY"},
+        {"billing_period": "MONTHLY", "trial_time_unit": "DAYS", "trial_time": 10},
+        {"billing_period": "WEEKLY", "trial_time_unit": "UNLIMITED"},
+        {"billing_period": "WEEKLY"},
+    ]
+
+    for payload in payloads:
+        payload.update({"account_id": 1, "products": [{"product_id": 1}]})
+
+        response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+
+        assert response.status_code == 201
+
+    assert valid_subscription_ids_for_invoice(today, [1, 2, 3, 4, 99]) == {1, 4}
+    assert valid_subscription_ids_for_invoice(today, []) == set()
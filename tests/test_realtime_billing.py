@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app import scheduler
+from app.billing.realtime import bill_subscription
+from app.database.models import Account, Invoice, InvoiceItem, Product, Subscription
+from tests.conftest import AUTH_HEADERS
+
+
+def create_subscription(client: TestClient, **kwargs):
+
+    payload = {
+        "account_id": 1,
+        "products": [{"product_id": 1, "quantity": 1}],
+        "billing_period": "MONTHLY",
+        **kwargs,
+    }
+    response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+    assert response.status_code == 201
+
+    return response.json()["id"]
+
+
+def test_realtime_billing(client: TestClient, db, monkeypatch):
+
+    monkeypatch.setattr(scheduler.app.conf, "task_always_eager", True)
+    monkeypatch.setattr(scheduler, "REALTIME_BILLING", True)
+
+    db.add(
+        Account(first_name="1", external_id=1, email="test@example.com", tenant_id=1)
+    )
+    db.add(Product(name="product 1", price=10, is_available=True, tenant_id=1))
+    db.commit()
+
+    subscription_id = create_subscription(client)
+
+    invoice = db.exec(select(Invoice)).one()
+
+    assert invoice.billing_date == datetime.now(timezone.utc).date()
+    assert db.exec(select(InvoiceItem.subscription_id)).all() == [subscription_id]
+
+    # Duplicate delivery
+    assert bill_subscription(subscription_id) == {}
+    assert len(db.exec(select(InvoiceItem)).all()) == 1
+
+    # Another subscription of the account due the same day
+    second_id = create_subscription(client)
+
+    assert len(db.exec(select(Invoice)).all()) == 2
+    assert db.exec(select(InvoiceItem.subscription_id)).all() == [
+        subscription_id,
+        second_id,
+    ]
+
+    # Beyond the horizon, left to the billing runs
+    trial_id = create_subscription(client, trial_time_unit="DAYS", trial_time=10)
+
+    assert len(db.exec(select(InvoiceItem)).all()) == 2
+    assert db.get(Subscription, trial_id).charged_through_date is None
+
+
+def test_realtime_billing_disabled(client: TestClient, db, monkeypatch):
+
+    monkeypatch.setattr(scheduler.app.conf, "task_always_eager", True)
+
+    db.add(
+        Account(first_name="1", external_id=1, email="test@example.com", tenant_id=1)
+    )
+    db.add(Product(name="product 1", price=10, is_available=True, tenant_id=1))
+    db.commit()
+
+    create_subscription(client)
+
+    assert db.exec(select(Invoice)).first() is None
@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app.billing import jobs, runs
+from app.database.models import Invoice, ScheduledJob
+from tests.test_scheduler import fill_db
+
+
+def test_next_run():
+
+    now = datetime(2025, 1, 15, 5, 10, tzinfo=timezone.utc)
+
+    assert jobs.next_midnight(now) == datetime(2025, 1, 16, tzinfo=timezone.utc)
+    assert jobs.next_hour(now) == datetime(2025, 1, 15, 6, tzinfo=timezone.utc)
+
+
+def test_claim_job(client: TestClient, db):
+
+    now = datetime.now(timezone.utc)
+
+    jobs.ensure_jobs(now - timedelta(days=1))
+
+    assert jobs.claim_job("billing", "worker-1", now)
+    assert not jobs.claim_job("billing", "worker-2", now)
+
+    # Stale claim
+    assert jobs.claim_job("billing", "worker-2", now + timedelta(hours=1))
+
+    jobs.finish_job("billing", "worker-1", now, "SUCCESS")
+
+    assert db.get(ScheduledJob, "billing").owner == "worker-2"
+
+
+def test_run_pending_jobs(client: TestClient, db):
+
+    fill_db(client, db)
+
+    now = datetime.now(timezone.utc)
+
+    assert jobs.run_pending_jobs(now) == []
+    assert db.get(ScheduledJob, "billing").next_run > now.replace(tzinfo=None)
+
+    job = db.get(ScheduledJob, "billing")
+    job.next_run = now - timedelta(minutes=1)
+    db.add(job)
+    db.commit()
+
+    assert jobs.run_pending_jobs(now) == ["billing"]
+    assert len(db.exec(select(Invoice)).all()) == 3
+
+    db.refresh(job)
+
+    assert job.last_status == "SUCCESS"
+    assert job.owner is None
+    assert job.next_run == jobs.next_midnight(now).replace(tzinfo=None)
+
+    assert jobs.run_pending_jobs(now) == []
+
+
+def test_bill_daily_local_date(monkeypatch):
+
+    monkeypatch.setattr(jobs, "TIME_ZONE", "America/New_York")
+
+    calls = []
+    monkeypatch.setattr(jobs, "run_sweep", calls.append)
+    monkeypatch.setattr(
+        jobs, "run_billing", lambda today, heartbeat=None: calls.append(today)
+    )
+
+    # Still the 14th in New York
+    jobs.bill_daily(datetime(2025, 1, 15, 3, tzinfo=timezone.utc))
+
+    assert calls == [datetime(2025, 1, 14).date(), datetime(2025, 1, 14)]
+
+
+def test_run_pending_jobs_renews_claim(client: TestClient, db, monkeypatch):
+
+    fill_db(client, db)
+
+    monkeypatch.setattr(runs, "BILLING_BATCH_SIZE", 1)
+
+    now = datetime.now(timezone.utc) - timedelta(minutes=1)
+
+    jobs.ensure_jobs(now - timedelta(days=1))
+
+    claims = []
+    renew_job = jobs.renew_job
+
+    def record_claim(name, owner, ttl=jobs.BILLING_LEASE_TTL):
+        assert renew_job(name, owner, ttl)
+        claims.append(db.exec(select(ScheduledJob.locked_until)).one())
+
+    monkeypatch.setattr(jobs, "renew_job", record_claim)
+
+    assert jobs.run_pending_jobs(now) == ["billing"]
+
+    # Once per batch, past the claim taken at `now`
+    assert len(claims) == 3
+    assert claims[0] > (now + timedelta(seconds=jobs.BILLING_LEASE_TTL)).replace(
+        tzinfo=None
+    )
@@ -0,0 +1,100 @@
+from datetime import datetime, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app.database.models import Account, Invoice, InvoiceItem, Product, Subscription
+from app.scheduler import (
+    app,
+    generate_invoices,
+    slot_countdown,
+    visibility_timeout,
+)
+from tests.conftest import AUTH_HEADERS
+
+
+def fill_db(client: TestClient, db):
+
+    for i in range(1, 4):
+        db.add(
+            Account(
+                first_name=str(i),
+                external_id=i,
+                email=f"test{i}@example.com",
+                tenant_id=1,
+                credit=100,
+            )
+        )
+    db.commit()
+
+    db.add(Product(name="product 1", price=30, is_available=True, tenant_id=1))
+    db.commit()
+
+    for account_id in (1, 2, 2, 3):
+        payload = {
+            "account_id": account_id,
+            "products": [{"product_id": 1, "quantity": 1}],
+            "billing_period": "MONTHLY",
+        }
+        response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+        assert response.status_code == 201
+
+    payload["trial_time_unit"] = "DAYS"
+    payload["trial_time"] = 10
+    response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+    assert response.status_code == 201
+
+
+def test_generate_invoices(client: TestClient, db, monkeypatch):
+
+    monkeypatch.setattr(app.conf, "task_always_eager", True)
+
+    fill_db(client, db)
+
+    result = generate_invoices.delay(shards=2).get()
+
+    assert result.get() == {"accounts": 3, "invoices": 3, "subscriptions": 4}
+
+    invoices = db.exec(select(Invoice).order_by(Invoice.account_id)).all()
+
+    assert [invoice.account_id for invoice in invoices] == [1, 2, 3]
+    assert len(db.exec(select(InvoiceItem)).all()) == 4
+
+    assert [account.credit for account in db.exec(select(Account)).all()] == [
+        70,
+        40,
+        70,
+    ]
+
+    today = datetime.now(timezone.utc).date()
+
+    subscriptions = db.exec(select(Subscription).order_by(Subscription.id)).all()
+
+    assert [s.charged_through_date for s in subscriptions] == [today] * 4 + [None]
+
+    generate_invoices.delay(shards=2)
+
+    assert len(db.exec(select(Invoice)).all()) == 3
+
+
+def test_slot_countdown():
+
+    assert [slot_countdown(shard, 4, 0) for shard in range(4)] == [0, 0, 0, 0]
+    assert [slot_countdown(shard, 4, 120) for shard in range(4)] == [
+        0,
+        1800,
+        3600,
+        5400,
+    ]
+
+
+def test_visibility_timeout():
+
+    assert visibility_timeout(0, 0) == 3600
+    assert visibility_timeout(120, 0) > slot_countdown(3, 4, 120)
+
+    # Realtime invoices queued a day ahead
+    assert visibility_timeout(0, 24) == 25 * 3600
+    assert visibility_timeout(120, 24) == 25 * 3600
+    assert visibility_timeout(48 * 60, 24) == 49 * 3600
+    assert app.conf.broker_transport_options["visibility_timeout"] >= 3600
@@ -0,0 +1,158 @@
+from datetime import datetime, timedelta, timezone
+
+from fastapi.testclient import TestClient
+from sqlmodel import select
+
+from app.billing.runs import run_billing
+from app.database.models import (
+    Account,
+    BillingPeriod,
+    BillingSchedule,
+    Invoice,
+    Product,
+    State,
+    Subscription,
+)
+from app.invoices.create import add_billing_period
+from app.subscriptions.sweep import resumed_billing_date, run_sweep
+from tests.conftest import AUTH_HEADERS
+
+
+def test_sweep_subscriptions(client: TestClient, db):
+
+    db.add(Account(first_name="1", email="test@example.com", tenant_id=1))
+    db.add(Product(name="product 1", price=10, is_available=True, tenant_id=1))
+    db.commit()
+
+    for _ in range(4):
+        payload = {
+            "account_id": 1,
+            "products": [{"product_id": 1, "quantity": 1}],
+            "billing_period": "MONTHLY",
+        }
+        response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+        assert response.status_code == 201
+
+    today = datetime.now(timezone.utc).date()
+    end_date = today + timedelta(days=3)
+    resume_date = today + timedelta(days=5)
+
+    response = client.delete(
+        f"/v1/subscriptions/1?end_date={end_date}", headers=AUTH_HEADERS
+    )
+    assert response.json()["state"] == State.ACTIVE
+
+    response = client.put(
+        f"/v1/subscriptions/2/pause?resume={resume_date}", headers=AUTH_HEADERS
+    )
+    assert response.json()["state"] == State.PAUSED
+
+    # Paused without a resume date
+    client.put("/v1/subscriptions/3/pause", headers=AUTH_HEADERS)
+
+    assert run_sweep(today) == {"cancelled": 0, "resumed": 0}
+
+    assert run_sweep(end_date) == {"cancelled": 1, "resumed": 0}
+    assert run_sweep(resume_date) == {"cancelled": 0, "resumed": 1}
+    assert run_sweep(resume_date) == {"cancelled": 0, "resumed": 0}
+
+    subscriptions = db.exec(select(Subscription).order_by(Subscription.id)).all()
+
+    assert [s.state for s in subscriptions] == [
+        State.CANCELLED,
+        State.ACTIVE,
+        State.PAUSED,
+        State.ACTIVE,
+    ]
+    assert subscriptions[1].resume_date is None
+
+    schedule = db.exec(
+        select(BillingSchedule.subscription_id).order_by(
+            BillingSchedule.subscription_id
+        )
+    ).all()
+
+    assert schedule == [2, 4]
+
+
+def test_sweep_subscriptions_timezones(client: TestClient, db):
+
+    db.add(Account(first_name="1", email="test@example.com", tenant_id=1))
+    db.add(Product(name="product 1", price=10, is_available=True, tenant_id=1))
+    db.commit()
+
+    payload = {
+        "account_id": 1,
+        "products": [{"product_id": 1, "quantity": 1}],
+        "billing_period": "MONTHLY",
+        "end_date": str(datetime.now(timezone.utc).date() + timedelta(days=1)),
+    }
+    response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+    assert response.status_code == 201
+
+    tomorrow = datetime.now(timezone.utc).date() + timedelta(days=1)
+
+    assert run_sweep(tomorrow, ["Asia/Tokyo"]) == {"cancelled": 0, "resumed": 0}
+    assert run_sweep(tomorrow, ["UTC"]) == {"cancelled": 1, "resumed": 0}
+
+
+def test_sweep_resumed_subscription_next_period(client: TestClient, db):
+
+    db.add(Account(first_name="1", email="test@example.com", tenant_id=1))
+    db.add(Product(name="product 1", price=10, is_available=True, tenant_id=1))
+    db.commit()
+
+    payload = {
+        "account_id": 1,
+        "products": [{"product_id": 1, "quantity": 1}],
+        "billing_period": "MONTHLY",
+    }
+    response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+    assert response.status_code == 201
+
+    today = datetime.now(timezone.utc).date()
+    billing_day = response.json()["billing_day"]
+
+    run_billing(datetime.combine(today, datetime.min.time()))
+
+    # Paused over the next period
+    resume_date = today + timedelta(days=40)
+    client.put(f"/v1/subscriptions/1/pause?resume={resume_date}", headers=AUTH_HEADERS)
+
+    assert run_sweep(resume_date) == {"cancelled": 0, "resumed": 1}
+
+    next_period = add_billing_period(BillingPeriod.MONTHLY, today, billing_day)
+    next_period = add_billing_period(BillingPeriod.MONTHLY, next_period, billing_day)
+
+    db.expire_all()
+
+    assert db.get(Subscription, 1).next_billing_date == next_period
+    assert db.exec(select(BillingSchedule.due_date)).all() == [next_period]
+
+    # Not billed for the skipped period, billed on the next one
+    assert (
+        run_billing(datetime.combine(resume_date, datetime.min.time()))["invoices"] == 0
+    )
+    assert (
+        run_billing(datetime.combine(next_period, datetime.min.time()))["invoices"] == 1
+    )
+    assert len(db.exec(select(Invoice)).all()) == 2
+
+
+def test_resumed_billing_date():
+
+    today = datetime(2025, 1, 20).date()
+
+    assert resumed_billing_date(BillingPeriod.WEEKLY, today) == today
+    assert resumed_billing_date(BillingPeriod.MONTHLY, today, 25) == today.replace(
+        day=25
+    )
+    assert resumed_billing_date(BillingPeriod.MONTHLY, today, 20) == today
+    assert (
+        resumed_billing_date(BillingPeriod.QUARTERLY, today, 5)
+        == datetime(2025, 2, 5).date()
+    )
+    assert (
+        resumed_billing_date(BillingPeriod.MONTHLY, datetime(2025, 2, 10).date(), 31)
+        == datetime(2025, 2, 28).date()
+    )
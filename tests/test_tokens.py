@@ -0,0 +1,67 @@
+from fastapi.testclient import TestClient
+
+from app.database import deps
+from app.security import create_access_token
+from tests.conftest import AUTH_HEADERS
+
+
+def bearer(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_create_token(client: TestClient, monkeypatch):
+
+    response = client.post("/v1/tokens", headers=AUTH_HEADERS)
+
+    assert response.status_code == 201
+    assert response.json()["token_type"] == "bearer"
+
+    token = response.json()["access_token"]
+
+    def fail_verify_password(*args):
+        raise AssertionError("token requests must not verify the secret")
+
+    monkeypatch.setattr(deps, "verify_password", fail_verify_password)
+
+    response = client.post(
+        "/v1/accounts", json={"first_name": "Token"}, headers=bearer(token)
+    )
+
+    assert response.status_code == 201
+
+    response = client.get("/v1/accounts", headers=bearer(token))
+
+    assert response.status_code == 200
+    assert [account["first_name"] for account in response.json()] == ["Token"]
+
+
+def test_invalid_token(client: TestClient):
+
+    token, _ = create_access_token(1)
+    payload, signature = token.split(".")
+
+    for invalid in (
+        "12345abcd",
+        f"{payload}.{signature[:-2]}aa",
+        f"{create_access_token(2)[0].split('.')[0]}.{signature}",
+        create_access_token(1, ttl=-1)[0],
+    ):
+        response = client.get("/v1/accounts", headers=bearer(invalid))
+
+        assert response.status_code == 401
+        assert response.json()["detail"] == "Invalid or expired token"
+
+
+def test_create_token_requires_credentials(client: TestClient):
+
+    token, _ = create_access_token(1)
+
+    assert client.post("/v1/tokens").status_code == 403
+    assert client.post("/v1/tokens", headers=bearer(token)).status_code == 403
+    assert (
+        client.post(
+            "/v1/tokens",
+            headers={**AUTH_HEADERS, "X-BillFlow-ApiSecret": "12345abcd"},
+        ).status_code
+        == 401
+    )
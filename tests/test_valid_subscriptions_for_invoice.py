@@ -5,7 +5,11 @@ from dateutil.relativedelta import relativedelta
 from fastapi.testclient import TestClient
 
 from app.database.models import Account, BillingPeriod, Product
-from app.invoices.utils import valid_subscriptions_for_invoice
+from app.invoices.utils import (
+    group_subscriptions_by_account,
+    iter_valid_subscriptions_for_invoice,
+    valid_subscriptions_for_invoice,
+)
 from tests.conftest import AUTH_HEADERS
 
 
@@ -120,3 +124,51 @@ def test_valid_subscriptions_for_invoice(client: TestClient, db):
     assert (
         len(subscriptions_by_one_account) == len(BillingPeriod.__members__.keys()) * 2
     )
+
+
+def test_iter_valid_subscriptions_for_invoice(client: TestClient, db):
+
+    for i in range(1, 4):
+        db.add(
+            Account(
+                first_name=str(i),
+                external_id=i,
+                email=f"test{i}@example.com",
+                tenant_id=1,
+            )
+        )
+    db.commit()
+
+    db.add(Product(name="product 1", price=30, is_available=True, tenant_id=1))
+    db.commit()
+
+    for account_id in (3, 1, 2, 1, 3, 3):
+        payload = {
+            "account_id": account_id,
+            "products": [{"product_id": 1, "quantity": 1}],
+            "billing_period": "MONTHLY",
+        }
+        response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+        assert response.status_code == 201
+
+    payload["trial_time_unit"] = "UNLIMITED"
+    response = client.post("/v1/subscriptions", json=payload, headers=AUTH_HEADERS)
+    assert response.status_code == 201
+
+    today = datetime.now(timezone.utc)
+
+    rows = list(iter_valid_subscriptions_for_invoice(today, page_size=2))
+
+    assert rows == [(1, 2), (1, 4), (2, 3), (3, 1), (3, 5), (3, 6)]
+
+    assert list(group_subscriptions_by_account(iter(rows))) == [
+        (1, [2, 4]),
+        (2, [3]),
+        (3, [1, 5, 6]),
+    ]
+
+    assert list(iter_valid_subscriptions_for_invoice(today, 3, page_size=1)) == [
+        (3, 1),
+        (3, 5),
+        (3, 6),
+    ]